@@ -1,21 +1,76 @@
+import asyncio
+import json
+import math
+from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, EmailStr
-from .crawlers import search_all
+from .db_pool import init_db_pool, close_db_pool
+from .driver_pool import start_pools, shutdown_pools
+from .password_hashing import AuthBusyError, shutdown_hash_pool
+from .basket_optimizer import optimise_basket
+from .crawl_engine import crawl_engine, CRAWL_STORE_TIMEOUT
+from .warmup import WARMUP_ENABLED, WarmupScheduler
+from .crawlers import close_http_client
+from .matching import match_groups, catalogue_index, start_catalogue_load
+from .pricing import compare_results
+from .query_canon import canonical_query
+from .search_cache import result_cache
+from .search_match_buffer import search_match_buffer
+from .typeahead import typeahead_index, start_typeahead_load
 from .database_ops import (
-    _login_logic as db_login,
-    _register_logic as db_register_user,
     get_db_connection,
-    update_user,
     is_valid_email,
     is_strong_password,
-    insert_search_match,
+    create_price_tables,
+    create_search_stats_table,
+)
+from .database_async import (
+    _login_logic as db_login,
+    _register_logic as db_register_user,
+    update_user,
     get_top_search_words,
+    init_async_pool,
+    close_async_pool,
+    top_search_cache,
 )
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db_pool()
+    try:
+        await init_async_pool()
+    except Exception as e:
+        print(f"[startup] Could not open the async database pool: {e}")
+    try:
+        create_price_tables()
+    except Exception as e:
+        print(f"[startup] Could not create price store tables: {e}")
+    try:
+        create_search_stats_table()
+    except Exception as e:
+        print(f"[startup] Could not create the search stats table: {e}")
+    start_catalogue_load()
+    start_typeahead_load()
+    start_pools()
+    await crawl_engine.start()
+    await search_match_buffer.start()
+    if WARMUP_ENABLED:
+        await warmup_scheduler.start()
+    yield
+    await search_match_buffer.stop()
+    await warmup_scheduler.stop()
+    await crawl_engine.stop()
+    shutdown_pools()
+    close_http_client()
+    shutdown_hash_pool()
+    await close_async_pool()
+    close_db_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +84,22 @@ class SearchResponse(BaseModel):
     query: str
     key: str
     results: dict
+    pending: list[str] = []
+    comparison: list[dict] = []  # every product, cheapest per unit first
+    matches: list[dict] = []  # the same product found in several stores
+
+class BatchSearchPayload(BaseModel):
+    terms: list[str]
+
+class BasketOptionItem(BaseModel):
+    name: str
+    quantity: int = 1
+    options: dict[str, int]  # store -> price in pence
+
+class BasketOptimisePayload(BaseModel):
+    items: list[BasketOptionItem]
+    max_stores: Optional[int] = None
+    stop_penalty_pence: int = 0
 
 class SearchMatchPayload(BaseModel):
     user_id: int
@@ -49,23 +120,30 @@ class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     password: Optional[str] = None
 
-def normalize_query(q: str) -> str:
-    import re
-    return re.sub(r'[^a-z0-9 ]+', '', q.lower().strip())
+warmup_scheduler = WarmupScheduler(canonical_query)
+
 
+def auth_busy(e: AuthBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 @app.post("/api/login", response_model=AuthResponse)
-def api_login(creds: Credentials):
-    result = db_login(creds.email, creds.password)
+async def api_login(creds: Credentials):
+    try:
+        result = await db_login(creds.email, creds.password)
+    except AuthBusyError as e:
+        raise auth_busy(e)
     return AuthResponse(**result)
 
 @app.post("/api/register", response_model=AuthResponse)
-def api_register(creds: Credentials):
-    result = db_register_user(creds.email, creds.password)
+async def api_register(creds: Credentials):
+    try:
+        result = await db_register_user(creds.email, creds.password)
+    except AuthBusyError as e:
+        raise auth_busy(e)
     return AuthResponse(**result)
 
 @app.put("/api/user/{user_id}", response_model=AuthResponse)
-def update_user_endpoint(user_id: int, update: UserUpdate):
+async def update_user_endpoint(user_id: int, update: UserUpdate):
     if update.email is not None and not is_valid_email(update.email):
         return AuthResponse(success=False, error="Invalid email format.")
     if update.password is not None and not is_strong_password(update.password):
@@ -74,15 +152,23 @@ def update_user_endpoint(user_id: int, update: UserUpdate):
             error="Password must be at least 6 characters long, contain a number and an uppercase letter.",
         )
 
-    success = update_user(user_id, update.email, update.password)
+    try:
+        success = await update_user(user_id, update.email, update.password)
+    except AuthBusyError as e:
+        raise auth_busy(e)
     if not success:
         return AuthResponse(success=False, error="Update failed.")
     return AuthResponse(success=True, message="User updated successfully.", user_id=user_id, email=update.email)
 
+def client_id(request: Request) -> str:
+    return request.client.host if request.client else "anonymous"
+
 @app.get("/api/search", response_model=SearchResponse)
-def api_search(q: str):
-    key = normalize_query(q)
-    results = search_all(q)
+async def api_search(q: str, request: Request):
+    key = canonical_query(q)
+    results, pending = await crawl_engine.search(q, key, client_id(request))
+    comparison = await asyncio.to_thread(compare_results, results)
+    matches = await asyncio.to_thread(match_groups, results)
 
     return SearchResponse(
         query=q,
@@ -92,17 +178,168 @@ def api_search(q: str):
             "homebargains": results.get("homebargains", []),
             "morrisons":    results.get("morrisons", []),
         },
+        pending=pending,
+        comparison=comparison,
+        matches=matches,
     )
 
+@app.get("/api/search/stream")
+async def api_search_stream(q: str, request: Request):
+    """
+    Same search as /api/search, streamed as NDJSON: one
+    {"type": "store", "store", "results"} line per store as soon as that
+    store finishes, then a final {"type": "done", "query", "key", "pending",
+    "comparison", "matches"} line. Stores that hit the crawl timeout are
+    listed in "pending"; "comparison" and "matches" cover what did arrive.
+    While a store is on the LLM fallback, each product is also sent as a
+    {"type": "product", "store", "product"} line as soon as it is parsed.
+    """
+    key = canonical_query(q)
+    client = client_id(request)
+
+    async def stream():
+        events = asyncio.Queue()
+
+        def on_product(store, row):
+            events.put_nowait({"type": "product", "store": store, "product": row})
+
+        async def run():
+            results = {}
+            pending = []
+            comparison = []
+            matches = []
+            try:
+                async for store, store_results in crawl_engine.iter_search(q, key, client, on_product):
+                    if store_results is None:
+                        pending.append(store)
+                        continue
+                    results[store] = store_results
+                    events.put_nowait({"type": "store", "store": store, "results": store_results})
+                comparison = await asyncio.to_thread(compare_results, results)
+                matches = await asyncio.to_thread(match_groups, results)
+            finally:
+                events.put_nowait({"type": "done", "query": q, "key": key, "pending": pending,
+                                   "comparison": comparison, "matches": matches})
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                yield json.dumps(event) + "\n"
+                if event["type"] == "done":
+                    break
+        finally:
+            task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/api/search/batch")
+async def api_search_batch(payload: BatchSearchPayload, request: Request):
+    """
+    Search a whole shopping list in one request, streamed as NDJSON.
+
+    Terms are deduped by canonical_query and all queued on the crawl engine
+    at once, so each store works through the list back to back on its
+    pooled browsers. Lines sent:
+      {"type": "store", "query", "key", "store", "results"} per term and store,
+      {"type": "term", "query", "key", "results", "pending", "comparison", "matches"}
+        once a term is complete,
+      {"type": "done", "keys"} at the end.
+    """
+    terms = {}
+    for term in payload.terms:
+        key = canonical_query(term)
+        if key and key not in terms:
+            terms[key] = term.strip()
+    client = client_id(request)
+    # Later terms queue behind earlier ones, so scale the per-store timeout
+    rounds = math.ceil(len(terms) / crawl_engine.concurrency) if terms else 1
+    timeout = CRAWL_STORE_TIMEOUT * rounds
+
+    async def stream():
+        events = asyncio.Queue()
+
+        async def run_term(key, term):
+            results = {store: [] for store in ("sainsburys", "homebargains", "morrisons")}
+            pending = []
+            comparison = []
+            matches = []
+            try:
+                async for store, store_results in crawl_engine.iter_search(term, key, client, timeout=timeout):
+                    if store_results is None:
+                        pending.append(store)
+                        continue
+                    results[store] = store_results
+                    events.put_nowait({"type": "store", "query": term, "key": key,
+                                       "store": store, "results": store_results})
+                comparison = await asyncio.to_thread(compare_results, results)
+                matches = await asyncio.to_thread(match_groups, results)
+            finally:
+                events.put_nowait({"type": "term", "query": term, "key": key, "results": results,
+                                   "pending": pending, "comparison": comparison, "matches": matches})
+
+        async def run():
+            try:
+                await asyncio.gather(*(run_term(key, term) for key, term in terms.items()),
+                                     return_exceptions=True)
+            finally:
+                events.put_nowait({"type": "done", "keys": list(terms)})
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                yield json.dumps(event) + "\n"
+                if event["type"] == "done":
+                    break
+        finally:
+            task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/api/basket/optimise")
+async def api_optimise_basket(payload: BasketOptimisePayload):
+    """Which store to buy each item from, cheapest overall including the per-stop penalty."""
+    items = [item.model_dump() for item in payload.items]
+    return await asyncio.to_thread(
+        optimise_basket, items, payload.max_stores, payload.stop_penalty_pence,
+    )
+
+@app.get("/api/typeahead")
+def api_typeahead(q: str, limit: int = 10):
+    """
+    Query suggestions for a prefix from past searches and crawled product
+    names. "cached" marks terms every store can answer without a crawl.
+    """
+    suggestions = []
+    for term, score in typeahead_index.suggest(q, limit):
+        key = canonical_query(term)
+        cached = all(result_cache.get(key, store) is not None for store in ("sainsburys", "homebargains", "morrisons"))
+        suggestions.append({"term": term, "score": score, "cached": cached})
+    return {"prefix": q, "suggestions": suggestions}
+
+@app.get("/api/products/similar")
+def api_similar_products(name: str, limit: int = 20, exclude_store: Optional[str] = None):
+    """Products from any past crawl whose names match `name`, best match first."""
+    return {"products": catalogue_index.similar(name, limit=limit, exclude_store=exclude_store)}
+
 @app.post("/api/search-matches")
-def save_search_matches(payload: SearchMatchPayload):
+async def save_search_matches(payload: SearchMatchPayload):
+    """Fire-and-forget: words are buffered and written in batches (see search_match_buffer.py)."""
     if not payload.search_words:
-        return {"success": True, "saved": 0}
+        return {"success": True, "queued": 0}
+
+    queued = search_match_buffer.add(payload.user_id, payload.search_words)
+    typeahead_index.add_search_words(payload.search_words)
+    return {"success": True, "queued": queued}
 
-    saved = insert_search_match(payload.user_id, payload.search_words)
-    return {"success": True, "saved": saved}
+@app.get("/api/search-matches/stats")
+def search_match_stats():
+    return {**search_match_buffer.stats(), "top_search_cache": top_search_cache.stats()}
 
 @app.get("/api/user/{user_id}/top-searches")
-def get_top_searches(user_id: int, limit: int = 5):
-    words = get_top_search_words(user_id, limit)
+async def get_top_searches(user_id: int, limit: int = 5):
+    words = await get_top_search_words(user_id, limit)
+    # Warmed server-side in the next off-peak window
+    warmup_scheduler.queue_terms(words)
     return {"words": words}
\ No newline at end of file
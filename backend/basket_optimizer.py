@@ -0,0 +1,155 @@
+import os
+from itertools import combinations
+from typing import Optional
+
+import numpy as np
+
+# Picks which store to buy each basket item from.
+#
+# Every item comes with its price at each store that stocks it. A plan is a
+# set of stores to visit; each item is then bought wherever it's cheapest
+# among those stores. The cost of a plan is the items' total plus a
+# penalty per store visited, optionally capped at max_stores.
+#
+# The search is over store subsets, not items, so it stays exact for any
+# basket size while the number of stores is small. Past
+# BASKET_EXACT_MAX_STORES it switches to a greedy drop/swap heuristic.
+
+BASKET_EXACT_MAX_STORES = int(os.environ.get("BASKET_EXACT_MAX_STORES", "12"))
+
+# Stand-in price for an item the chosen stores don't stock, so the
+# heuristic is steered towards plans that cover more of the basket
+_UNCOVERED_PENCE = 1e9
+
+
+def _price_matrix(items: list[dict]) -> tuple[list[str], np.ndarray, np.ndarray, list[int]]:
+    """(stores, prices[item, store] with inf where not stocked, quantities, unavailable item indexes)."""
+    stores = sorted({store for item in items for store in item["options"]})
+    column = {store: j for j, store in enumerate(stores)}
+    prices = np.full((len(items), len(stores)), np.inf)
+    for i, item in enumerate(items):
+        for store, price in item["options"].items():
+            if price is not None:
+                prices[i, column[store]] = price
+    quantities = np.array([max(1, int(item.get("quantity", 1))) for item in items], dtype=np.float64)
+    unavailable = np.flatnonzero(~np.isfinite(prices).any(axis=1)).tolist() if stores else list(range(len(items)))
+    return stores, prices, quantities, unavailable
+
+
+def _plan_cost(prices: np.ndarray, quantities: np.ndarray, mask: np.ndarray, stop_penalty: float) -> float:
+    """Total for buying every item at its cheapest store within `mask`; uncovered items cost _UNCOVERED_PENCE."""
+    best = prices[:, mask].min(axis=1) if mask.any() else np.full(len(prices), np.inf)
+    best = np.where(np.isfinite(best), best, _UNCOVERED_PENCE)
+    return float((best * quantities).sum()) + stop_penalty * int(mask.sum())
+
+
+def _exact(prices, quantities, max_stores, stop_penalty) -> tuple[np.ndarray, float]:
+    n_stores = prices.shape[1]
+    best_mask, best_cost = None, np.inf
+    for size in range(1, min(max_stores, n_stores) + 1):
+        subsets = np.array(list(combinations(range(n_stores), size)))
+        # (subsets, items): each item's cheapest price across each candidate subset
+        per_item = prices[:, subsets].min(axis=2).T
+        costs = (per_item * quantities).sum(axis=1) + stop_penalty * size
+        k = int(np.argmin(costs))
+        if costs[k] < best_cost:
+            best_cost = float(costs[k])
+            best_mask = np.zeros(n_stores, dtype=bool)
+            best_mask[subsets[k]] = True
+    return best_mask, best_cost
+
+
+def _greedy(prices, quantities, max_stores, stop_penalty) -> tuple[np.ndarray, float]:
+    n_stores = prices.shape[1]
+    mask = np.ones(n_stores, dtype=bool)
+    cost = _plan_cost(prices, quantities, mask, stop_penalty)
+
+    # Drop the store whose removal helps most (or hurts least while over the cap)
+    while mask.sum() > 1:
+        best_j, best_cost = None, np.inf
+        for j in np.flatnonzero(mask):
+            mask[j] = False
+            trial = _plan_cost(prices, quantities, mask, stop_penalty)
+            mask[j] = True
+            if trial < best_cost:
+                best_j, best_cost = j, trial
+        if best_cost <= cost or mask.sum() > max_stores:
+            mask[best_j] = False
+            cost = best_cost
+        else:
+            break
+
+    # Then try swapping one visited store for an unvisited one until nothing improves
+    improved = True
+    while improved:
+        improved = False
+        for out in np.flatnonzero(mask):
+            for into in np.flatnonzero(~mask):
+                mask[out], mask[into] = False, True
+                trial = _plan_cost(prices, quantities, mask, stop_penalty)
+                if trial < cost:
+                    cost, improved = trial, True
+                    break
+                mask[out], mask[into] = True, False
+            if improved:
+                break
+    if cost >= _UNCOVERED_PENCE:
+        return None, np.inf  # couldn't cover every item within max_stores
+    return mask, cost
+
+
+def optimise_basket(items: list[dict], max_stores: Optional[int] = None,
+                    stop_penalty_pence: float = 0, method: str = "auto") -> dict:
+    """
+    Cheapest way to buy `items`, each {"name", "quantity", "options": {store: price_pence}}.
+
+    max_stores caps how many stores the plan visits; stop_penalty_pence is
+    added once per store visited. Items no store stocks are returned in
+    "unavailable" and left out of the plan. If no plan within max_stores
+    covers the rest, the cap is dropped and "max_stores_relaxed" is set.
+    method is "auto", "exact" or "greedy".
+    """
+    stores, prices, quantities, unavailable = _price_matrix(items)
+    plan = {
+        "stores": [],
+        "assignments": [],
+        "items_pence": 0,
+        "stop_penalty_pence": 0,
+        "total_pence": 0,
+        "unavailable": [items[i]["name"] for i in unavailable],
+        "method": None,
+        "max_stores_relaxed": False,
+    }
+    available = np.setdiff1d(np.arange(len(items)), unavailable)
+    if not len(available):
+        return plan
+
+    prices, quantities = prices[available], quantities[available]
+    cap = len(stores) if max_stores is None else max(1, max_stores)
+    if method == "auto":
+        method = "exact" if len(stores) <= BASKET_EXACT_MAX_STORES else "greedy"
+    solve = _exact if method == "exact" else _greedy
+    mask, cost = solve(prices, quantities, cap, stop_penalty_pence)
+
+    if mask is None or not np.isfinite(cost):
+        # The cap is too tight to cover every item: fall back to the cheapest covering plan
+        mask, cost = solve(prices, quantities, len(stores), stop_penalty_pence)
+        plan["max_stores_relaxed"] = True
+
+    columns = np.flatnonzero(mask)
+    chosen = columns[prices[:, columns].argmin(axis=1)]
+    for row, (i, j) in enumerate(zip(available, chosen)):
+        price = prices[row, j]
+        plan["assignments"].append({
+            "name": items[i]["name"],
+            "store": stores[j],
+            "quantity": int(quantities[row]),
+            "price_pence": int(price),
+            "line_pence": int(price * quantities[row]),
+        })
+    plan["stores"] = [stores[j] for j in columns]
+    plan["items_pence"] = sum(a["line_pence"] for a in plan["assignments"])
+    plan["stop_penalty_pence"] = int(round(stop_penalty_pence * len(columns)))
+    plan["total_pence"] = plan["items_pence"] + plan["stop_penalty_pence"]
+    plan["method"] = method
+    return plan
@@ -0,0 +1,72 @@
+"""
+Benchmark of the basket optimiser on random 50-item baskets.
+
+    python -m backend.benchmarks.bench_basket [--items 50] [--baskets 20]
+
+Reports median solve time for the exact and greedy solvers at several
+store counts, how far greedy lands above the exact optimum, and how often
+greedy had to exceed --max-stores where an exact plan within it exists.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from ..basket_optimizer import optimise_basket
+
+
+def random_basket(rng: random.Random, items: int, stores: int, stock_rate: float = 0.7) -> list[dict]:
+    names = [f"store-{j}" for j in range(stores)]
+    basket = []
+    for i in range(items):
+        base = rng.randint(40, 900)
+        options = {
+            store: int(base * rng.uniform(0.7, 1.4))
+            for store in names if rng.random() < stock_rate
+        }
+        if not options:
+            options[rng.choice(names)] = base
+        basket.append({"name": f"item-{i}", "quantity": rng.randint(1, 3), "options": options})
+    return basket
+
+
+def _solve(basket, method, max_stores, penalty):
+    t0 = time.perf_counter()
+    plan = optimise_basket(basket, max_stores=max_stores, stop_penalty_pence=penalty, method=method)
+    return plan, time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=50)
+    parser.add_argument("--baskets", type=int, default=20)
+    parser.add_argument("--penalty", type=int, default=150, help="pence per extra store visited")
+    parser.add_argument("--max-stores", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{args.items}-item baskets, {args.baskets} per row, penalty {args.penalty}p per stop")
+    print(f"{'stores':>7}{'exact (ms)':>12}{'greedy (ms)':>13}{'greedy gap':>12}{'missed cap':>12}{'stops':>7}")
+    for stores in (3, 5, 8, 12, 16, 24):
+        rng = random.Random(stores)
+        exact_times, greedy_times, gaps, stops = [], [], [], []
+        missed = 0
+        for _ in range(args.baskets):
+            basket = random_basket(rng, args.items, stores)
+            greedy, seconds = _solve(basket, "greedy", args.max_stores, args.penalty)
+            greedy_times.append(seconds)
+            if stores <= 16:
+                exact, seconds = _solve(basket, "exact", args.max_stores, args.penalty)
+                exact_times.append(seconds)
+                stops.append(len(exact["stores"]))
+                if greedy["max_stores_relaxed"] and not exact["max_stores_relaxed"]:
+                    missed += 1
+                else:
+                    gaps.append(greedy["total_pence"] / exact["total_pence"] - 1)
+        exact_ms = f"{statistics.median(exact_times) * 1000:.2f}" if exact_times else "-"
+        gap = f"{statistics.mean(gaps) * 100:.2f}%" if gaps else "-"
+        print(f"{stores:>7}{exact_ms:>12}{statistics.median(greedy_times) * 1000:>13.2f}{gap:>12}"
+              f"{missed:>12}{(statistics.mean(stops) if stops else 0):>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
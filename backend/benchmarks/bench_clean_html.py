@@ -0,0 +1,45 @@
+"""
+Micro-benchmark: lxml clean_html vs the original BeautifulSoup cleaner.
+
+    python -m backend.benchmarks.bench_clean_html [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from .corpus import load_corpus, stub_ollama, use_temp_llm_cache
+
+stub_ollama()
+use_temp_llm_cache()
+
+from .. import crawlers  # noqa: E402
+
+
+def _time(fn, html: str, repeat: int) -> tuple[float, str]:
+    timings = []
+    out = ""
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            out = fn(html)
+            timings.append(time.perf_counter() - t0)
+    return statistics.median(timings), out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'page':<28}{'size':>10}{'bs4 (ms)':>12}{'lxml (ms)':>12}{'speedup':>10}{'out bs4/lxml':>18}")
+    for name, _, html in load_corpus():
+        legacy, legacy_out = _time(crawlers._clean_html_bs4, html, args.repeat)
+        fast, fast_out = _time(crawlers.clean_html, html, args.repeat)
+        print(f"{name:<28}{len(html):>10,}{legacy * 1000:>12.1f}{fast * 1000:>12.1f}"
+              f"{legacy / fast:>9.1f}x{len(legacy_out):>9,}/{len(fast_out):<8,}")
+
+
+if __name__ == "__main__":
+    main()
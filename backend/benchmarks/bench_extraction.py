@@ -0,0 +1,96 @@
+"""
+Offline benchmark of the crawler extraction pipeline over the page corpus.
+
+    python -m backend.benchmarks.bench_extraction [--repeat 5] [--products 60]
+
+For every page it reports median wall time, peak traced memory and the
+number of products each stage produced. ollama is stubbed, so nothing
+here touches the network or a model.
+
+html_to_product_dicts[generic] only finds products whose price sits next
+to the product link, so it reports 0 on Sainsbury's and Home Bargains
+layouts, saved or synthetic; that is the fallback's real coverage.
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from .corpus import load_corpus, stub_ollama, use_temp_llm_cache
+
+stub_ollama()
+use_temp_llm_cache()
+
+from .. import crawlers  # noqa: E402
+from ..pricing import parse_price_pence  # noqa: E402
+
+
+def measure(fn, repeat: int):
+    """Return (result, median seconds, peak bytes). Peak comes from one extra traced run."""
+    timings = []
+    result = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - t0)
+
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, statistics.median(timings), peak
+
+
+def _count(result) -> str:
+    if isinstance(result, tuple):  # encode_for_llm -> (payload, fmt, products)
+        return f"{len(result[2])} ({result[1]})"
+    if isinstance(result, str):
+        return f"{len(result):,} chars"
+    if isinstance(result, list):
+        return str(len(result))
+    return "-"
+
+
+def stages(html: str, store: str) -> list[tuple[str, object]]:
+    """The pipeline stages for one page, as (label, zero-arg callable)."""
+    soup_parser = crawlers._HTML_PARSER
+    products = crawlers.html_to_product_dicts(BeautifulSoup(html, soup_parser), site=store)
+    prices = [p["price"] for p in products]
+    return [
+        ("clean_html", lambda: crawlers.clean_html(html)),
+        ("encode_for_llm", lambda: crawlers.encode_for_llm(html, site=store)),
+        ("html_to_product_dicts[known]",
+         lambda: crawlers.html_to_product_dicts(BeautifulSoup(html, soup_parser), site=store)),
+        ("html_to_product_dicts[generic]",
+         lambda: crawlers.html_to_product_dicts(BeautifulSoup(html, soup_parser), site="unknown")),
+        ("extract_page_products", lambda: crawlers.extract_page_products(html, store)),
+        ("toon_encode", lambda: crawlers.toon_encode(products)),
+        ("parse_price_pence", lambda: [parse_price_pence(p) for p in prices]),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--products", type=int, default=60, help="products per synthetic page")
+    args = parser.parse_args()
+
+    for name, store, html in load_corpus(products=args.products):
+        print(f"\n{name}  ({store}, {len(html):,} chars)")
+        print(f"  {'stage':<32}{'wall (ms)':>11}{'peak (KiB)':>12}  output")
+        with contextlib.redirect_stdout(io.StringIO()):
+            page_stages = stages(html, store)
+        for label, fn in page_stages:
+            result, seconds, peak = measure(fn, args.repeat)
+            print(f"  {label:<32}{seconds * 1000:>11.2f}{peak / 1024:>12,.0f}  {_count(result)}")
+
+
+if __name__ == "__main__":
+    main()
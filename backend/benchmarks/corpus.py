@@ -0,0 +1,147 @@
+"""
+Page corpus for the crawler benchmarks.
+
+Saved search pages are read from benchmarks/pages/<store>-<query>.html
+(e.g. sainsburys-milk.html, not committed) and from the store pages the
+tests use, tests/fixtures/<store>_<name>.html. Those check what each
+stage extracts from real markup, but the fixtures are trimmed to a few
+products, so every store also gets a full-size synthetic page built from
+the markup its selectors expect, padded with the scripts, inline SVG,
+styles and tracking attributes real pages carry. Everything runs offline.
+"""
+import os
+import random
+import re
+import sys
+import tempfile
+import types
+from pathlib import Path
+
+PAGES_DIR = Path(__file__).parent / "pages"
+FIXTURES_DIR = Path(__file__).parent.parent / "tests" / "fixtures"
+
+STORES = ("sainsburys", "homebargains", "morrisons")
+
+_PRODUCT_WORDS = [
+    "Semi Skimmed", "Whole", "Organic", "Free Range", "British", "Greek Style",
+    "Milk", "Eggs", "Butter", "Yogurt", "Cheddar", "Bread", "Bananas", "Tomatoes",
+    "Orange Juice", "Coffee", "Tea Bags", "Pasta", "Rice", "Chicken Breast",
+]
+_llm_cache_dir = None
+
+_SIZES = ["2 Pints", "4 Pints", "1L", "2L", "500g", "1kg", "6 x 330ml", "12 Pack", "400g", "250ml"]
+
+
+def stub_ollama() -> None:
+    """Make `import ollama` resolve to an offline stub that never answers."""
+    def chat(*args, **kwargs):
+        raise RuntimeError("ollama is stubbed out in benchmarks")
+
+    sys.modules["ollama"] = types.SimpleNamespace(chat=chat, ResponseError=RuntimeError)
+
+
+def use_temp_llm_cache() -> None:
+    """
+    Point the LLM cache at an empty temporary file, so learned selectors in
+    the dev cache (backend/llm_cache.sqlite3) don't change what the
+    benchmarks measure. Call before importing crawlers.
+    """
+    global _llm_cache_dir
+    _llm_cache_dir = tempfile.TemporaryDirectory(prefix="bench-llm-cache-")  # removed at exit
+    os.environ["LLM_CACHE_PATH"] = os.path.join(_llm_cache_dir.name, "llm_cache.sqlite3")
+
+
+def _noise(rng: random.Random, i: int) -> str:
+    attrs = " ".join(f'data-track-{k}="{rng.getrandbits(64):x}"' for k in range(6))
+    return (
+        f'<script type="application/json" id="tracking-{i}">'
+        + '{"event":"impression","payload":"' + "x" * rng.randint(200, 800) + '"}</script>'
+        f'<svg viewBox="0 0 24 24" aria-hidden="true"><path d="M{"L".join(f"{rng.random():.3f} {rng.random():.3f}" for _ in range(40))}"/></svg>'
+        f'<div class="ln-c-badge promo-{i % 7}" style="color:#{rng.getrandbits(24):06x}" {attrs}>\n\n      </div>'
+    )
+
+
+def _products(rng: random.Random, count: int) -> list[tuple[str, int]]:
+    out = []
+    for _ in range(count):
+        name = " ".join(rng.sample(_PRODUCT_WORDS, 3)) + " " + rng.choice(_SIZES)
+        out.append((name, rng.randint(35, 1299)))
+    return out
+
+
+def _price(pence: int) -> str:
+    return f"{pence}p" if pence < 100 else f"£{pence / 100:.2f}"
+
+
+def _sainsburys_card(i: int, name: str, pence: int, rng: random.Random) -> str:
+    slug = name.lower().replace(" ", "-")
+    return (
+        f'<article data-testid="product-tile-{i}" class="pt-grid-item ln-o-grid__item">'
+        f'<img src="/img/{i}.jpg" alt="{name}">{_noise(rng, i)}'
+        f'<h2 data-testid="product-tile-description" class="pt__info__description">'
+        f'<a class="pt__link" href="/gol-ui/product/{slug}">{name}</a></h2>'
+        f'<div class="pt__cost"><span data-testid="pt-retail-price" class="pt__cost__retail-price">{_price(pence)}</span>'
+        f'<span data-testid="pt-unit-price">£{pence / 50:.2f} / ltr</span></div>'
+        f'<button class="add-to-trolley">Add</button></article>\n'
+    )
+
+
+def _homebargains_card(i: int, name: str, pence: int, rng: random.Random) -> str:
+    price = _price(pence)
+    if i % 5 == 0:
+        price = f"{_price(pence + 100)}, {price}"
+    return (
+        f'<li class="ais-Hits-item">{_noise(rng, i)}<div class="product-card">'
+        f'<div class="item-name"><a href="/p/{i}">{name}</a></div>'
+        f'<div class="item-price">{price}</div><form><button>Add to basket</button></form>'
+        f'</div></li>\n'
+    )
+
+
+def _morrisons_card(i: int, name: str, pence: int, rng: random.Random) -> str:
+    slug = name.lower().replace(" ", "-")
+    return (
+        f'<div data-retailer-anchor="fop{i}" class="sc-fop-card">{_noise(rng, i)}'
+        f'<a data-test="fop-product-link" href="/products/{slug}/{100000 + i}">'
+        f'<h3 data-test="fop-title" class="_text_cn5lb_1">{name}</h3></a>'
+        f'<span class="salt-vc">Price</span><span data-test="fop-price" class="_display_xy0eg_1">{_price(pence)}</span>'
+        f'</div>\n'
+    )
+
+
+_CARD_BUILDERS = {
+    "sainsburys": _sainsburys_card,
+    "homebargains": _homebargains_card,
+    "morrisons": _morrisons_card,
+}
+
+
+def synthetic_page(store: str, products: int = 60, seed: int = 0) -> str:
+    rng = random.Random(f"{store}:{seed}")
+    build = _CARD_BUILDERS[store]
+    cards = "".join(build(i, name, pence, rng) for i, (name, pence) in enumerate(_products(rng, products)))
+    head = "".join(
+        f'<link rel="preload" href="/static/chunk-{i}.js"><script src="/static/chunk-{i}.js"></script>'
+        for i in range(40)
+    )
+    nav = "".join(f'<li><a href="/category/{w.lower()}">{w}</a></li>' for w in _PRODUCT_WORDS)
+    return (
+        f"<!DOCTYPE html><html><head><title>{store} search</title>{head}"
+        f"<style>{'.c{color:red}' * 2000}</style></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header>"
+        f'<main id="product-page"><ul class="ais-Hits-list">{cards}</ul></main>'
+        f"<footer>{_noise(rng, -1)}</footer><script>{'var a=1;' * 5000}</script></body></html>"
+    )
+
+
+def load_corpus(products: int = 60) -> list[tuple[str, str, str]]:
+    """Return [(page name, store, html)] — saved pages first, then one synthetic page per store."""
+    pages = []
+    for path in sorted(PAGES_DIR.glob("*.html")) + sorted(FIXTURES_DIR.glob("*.html")):
+        store = re.split(r"[-_]", path.stem, 1)[0]
+        if store in STORES:
+            pages.append((path.stem, store, path.read_text(encoding="utf-8")))
+
+    for store in STORES:
+        pages.append((f"{store}-synthetic", store, synthetic_page(store, products)))
+    return pages
@@ -0,0 +1,209 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .crawlers import STORE_CRAWLERS
+from .driver_pool import DRIVER_POOL_SIZE
+from .search_cache import result_cache, load_store_results
+
+# asyncio scheduler for the per-store crawls behind /api/search.
+#
+# Every store has a fixed number of worker tasks (one per pooled browser by
+# default), so the number of concurrent crawls per store is capped no matter
+# how many requests are waiting. Waiting crawls are queued per client and
+# served round-robin, so one user searching a long list can't starve others.
+# Identical (query, store) crawls are coalesced onto a single job.
+#
+# Crawls block for seconds to minutes, so they run on the engine's own
+# thread pool (one thread per worker) rather than the loop's default
+# executor, which stays free for short CPU work like ranking results.
+
+CRAWL_CONCURRENCY_PER_STORE = int(os.environ.get("CRAWL_CONCURRENCY_PER_STORE", str(DRIVER_POOL_SIZE)))
+CRAWL_STORE_TIMEOUT = float(os.environ.get("CRAWL_STORE_TIMEOUT", "90"))
+
+
+class _CrawlJob:
+    __slots__ = ("query", "key", "store", "future", "listeners")
+
+    def __init__(self, query: str, key: str, store: str, future: asyncio.Future):
+        self.query = query
+        self.key = key
+        self.store = store
+        self.future = future
+        self.listeners = []  # on_product callbacks of everyone waiting on this job
+
+
+class _FairQueue:
+    """FIFO per client, round-robin across clients."""
+
+    def __init__(self):
+        self._by_client: OrderedDict[str, deque] = OrderedDict()
+        self._pending = asyncio.Semaphore(0)
+
+    def put(self, client_id: str, job: _CrawlJob) -> None:
+        self._by_client.setdefault(client_id, deque()).append(job)
+        self._pending.release()
+
+    async def get(self) -> _CrawlJob:
+        await self._pending.acquire()
+        client_id, jobs = next(iter(self._by_client.items()))
+        job = jobs.popleft()
+        # Send this client to the back of the line
+        del self._by_client[client_id]
+        if jobs:
+            self._by_client[client_id] = jobs
+        return job
+
+    def __len__(self) -> int:
+        return sum(len(jobs) for jobs in self._by_client.values())
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Waiters may all have timed out; don't let asyncio warn about the error
+    if not future.cancelled():
+        future.exception()
+
+
+class CrawlEngine:
+    def __init__(self, concurrency: int = CRAWL_CONCURRENCY_PER_STORE,
+                 timeout: float = CRAWL_STORE_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self._queues: dict[str, _FairQueue] = {}
+        self._inflight: dict[tuple, _CrawlJob] = {}
+        self._running: dict[str, int] = {store: 0 for store in STORE_CRAWLERS}
+        self._workers: list[asyncio.Task] = []
+        self._executor = None
+
+    async def start(self) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.concurrency * len(STORE_CRAWLERS), thread_name_prefix="crawl"
+        )
+        self._queues = {store: _FairQueue() for store in STORE_CRAWLERS}
+        for store in STORE_CRAWLERS:
+            for i in range(self.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(store), name=f"crawl-{store}-{i}"))
+        print(f"[CrawlEngine] Started {self.concurrency} worker(s) per store.")
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        for job in self._inflight.values():
+            if not job.future.done():
+                job.future.cancel()
+        self._inflight.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        print("[CrawlEngine] Stopped.")
+
+    async def _worker(self, store: str) -> None:
+        queue = self._queues[store]
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await queue.get()
+            self._running[store] += 1
+
+            def on_product(row, job=job):
+                loop.call_soon_threadsafe(self._announce, job, row)
+
+            try:
+                # Selenium is blocking — run it on a thread, one per worker
+                results = await loop.run_in_executor(
+                    self._executor, load_store_results, job.query, job.key, store, on_product
+                )
+                result_cache.put(job.key, store, results)
+                if not job.future.done():
+                    job.future.set_result(results)
+            except Exception as e:
+                print(f"[CrawlEngine] {store} crawl for {job.key!r} failed: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._running[store] -= 1
+                self._inflight.pop((job.key, store), None)
+
+    @staticmethod
+    def _announce(job: _CrawlJob, row: list) -> None:
+        for listener in list(job.listeners):
+            try:
+                listener(row)
+            except Exception as e:
+                print(f"[CrawlEngine] on_product listener failed: {e}")
+
+    def submit(self, query: str, key: str, store: str, client_id: str,
+               on_product=None) -> asyncio.Future:
+        """
+        Queue a crawl of `store` for `key`, or join the one already queued/running.
+
+        on_product(row) is called on the event loop for each product the
+        crawl streams from here on (LLM fallback only).
+        """
+        job = self._inflight.get((key, store))
+        if job is None:
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(_consume_exception)
+            job = self._inflight[(key, store)] = _CrawlJob(query, key, store, future)
+            self._queues[store].put(client_id, job)
+        if on_product is not None:
+            job.listeners.append(on_product)
+        return job.future
+
+    async def fetch_store(self, query: str, key: str, store: str, client_id: str,
+                          timeout: float = None, on_product=None):
+        """
+        Return `store`'s results for `key`, or None if they didn't arrive
+        within the timeout. A timed-out crawl keeps running and fills the
+        cache for the next request.
+        """
+        cached = result_cache.get(key, store)
+        if cached is not None:
+            return cached
+        future = self.submit(query, key, store, client_id, on_product)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            print(f"[CrawlEngine] {store} timed out for {key!r} — returning partial results.")
+            return None
+        except Exception as e:
+            print(f"[CrawlEngine] {store} failed for {key!r}: {e}")
+            return []
+
+    async def iter_search(self, query: str, key: str, client_id: str, on_product=None,
+                          timeout: float = None):
+        """
+        Yield (store, results) as each store finishes; results is None on timeout.
+
+        on_product(store, row) receives products streamed before a store finishes.
+        """
+        async def one(store):
+            listener = None
+            if on_product is not None:
+                listener = lambda row: on_product(store, row)
+            return store, await self.fetch_store(query, key, store, client_id, timeout, listener)
+
+        for next_done in asyncio.as_completed([one(store) for store in STORE_CRAWLERS]):
+            yield await next_done
+
+    async def search(self, query: str, key: str, client_id: str) -> tuple[dict, list[str]]:
+        """Return ({store: results}, [stores that timed out])."""
+        results = {}
+        pending = []
+        async for store, store_results in self.iter_search(query, key, client_id):
+            if store_results is None:
+                pending.append(store)
+                store_results = []
+            results[store] = store_results
+        return results, pending
+
+    def stats(self) -> dict:
+        return {
+            store: {"queued": len(queue), "running": self._running[store]}
+            for store, queue in self._queues.items()
+        }
+
+
+crawl_engine = CrawlEngine()
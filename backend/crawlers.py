@@ -1,16 +1,29 @@
-from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
 from urllib.parse import quote
+from html import escape as _html_escape
 from bs4 import BeautifulSoup
+import os
 import time
+import httpx
 import ollama
 import json
 import re as _re
+import threading
+from typing import Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from .driver_pool import driver_session
+from .extraction_cache import (
+    payload_hash,
+    get_cached_extraction,
+    store_extraction,
+    get_learned_selectors,
+    store_learned_selectors,
+    mark_learned_selectors_used,
+)
 
 # https://www.sainsburys.co.uk/gol-ui/SearchResults/
 
@@ -21,10 +34,62 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 FORCE_HEURISTIC_FALLBACK = False
 FORCE_LLM_HEURISTIC_BYPASS = False
 
+# C-backed parser for full rendered pages when lxml is installed
+try:
+    from lxml import etree as _etree, html as _lxml_html
+    _HTML_PARSER = "lxml"
+except ImportError:
+    _etree = _lxml_html = None
+    _HTML_PARSER = "html.parser"
+
+# Directory to save every rendered search page to (e.g. "backend/benchmarks/pages"),
+# to grow the offline benchmark corpus. None disables saving.
+SAVE_PAGES_DIR = None
+
+# Try a plain HTTP fetch (JSON API or server-rendered HTML) before starting a browser
+HTTP_FIRST_FETCH = True
+# Kept short: a blocked or hanging store must not hold up the browser fallback
+HTTP_CONNECT_TIMEOUT = 2.0
+HTTP_FETCH_TIMEOUT = 4.0
+# After this many failed HTTP fetches in a row a store goes straight to the
+# browser for HTTP_FIRST_COOLDOWN seconds, then HTTP is tried again
+HTTP_FIRST_MAX_FAILURES = 3
+HTTP_FIRST_COOLDOWN = 600.0
+# Stores whose HTTP strategy is tried. Home Bargains renders its results
+# client-side (Algolia), so its plain HTML almost never has products and the
+# fetch would only delay the browser.
+HTTP_FIRST_STORES = {"sainsburys", "morrisons"}
+
 #DEFAULT_MODEL = "qwen2.5:7b"
 DEFAULT_MODEL = "gemma4:e4b"
 FALLBACK_MODEL = "phi3:3.8b"
 
+# Cleaned HTML is split into chunks of about this many tokens, sent to the
+# model concurrently by up to LLM_MAX_WORKERS threads
+LLM_CHUNK_TOKENS = 6000
+LLM_MAX_WORKERS = 3
+# Stop a streaming response once it has produced this many products
+LLM_MAX_PRODUCTS = 150
+
+# Ask Ollama to constrain output to PRODUCTS_SCHEMA (structured outputs)
+STRUCTURED_OUTPUT = True
+# Extra attempts on the same model when a chunk's output is unusable
+LLM_OUTPUT_RETRIES = 1
+
+PRODUCTS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "price": {"type": "string"},
+            "href": {"type": "string"},
+        },
+        "required": ["name", "price", "href"],
+    },
+}
+_CHARS_PER_TOKEN = 4
+
 # Tags that are pure noise — remove entirely including their children
 _STRIP_TAGS = [
     "script", "style", "svg", "noscript", "img", "picture", "source",
@@ -35,258 +100,341 @@ _STRIP_TAGS = [
 # Attributes worth keeping — everything else is stripped
 _KEEP_ATTRS = {"href", "class", "data-testid", "data-test", "data-retailer-anchor", "id"}
 
+# Per-store product card selectors. Each layout lists a card selector and,
+# per field, selectors tried in order within the card. Layouts are tried in
+# order until one yields products (e.g. Morrisons' Angular fallback).
+_STORE_SELECTORS = {
+    "sainsburys": {
+        "base": "https://www.sainsburys.co.uk",
+        "layouts": [
+            {
+                "card": "article[data-testid^='product-tile-']",
+                "name": ["[data-testid='product-tile-description'] a"],
+                "price": [
+                    "[data-testid='contextual-price-text']",
+                    "[data-testid='pt-retail-price']",
+                    ".pt__cost--price",
+                ],
+                "href": ["[data-testid='product-tile-description'] a"],
+                "require_price": False,
+            },
+        ],
+    },
+    "homebargains": {
+        "base": "https://home.bargains",
+        "layouts": [
+            {
+                "card": "li.ais-Hits-item",
+                "name": [".item-name a", ".title", "a[href]"],
+                "price": [".item-price", ".price"],
+                "href": ["a[href]"],
+                "last_price": True,
+            },
+            {
+                "card": "li:has(.item-name)",
+                "name": [".item-name a", ".title"],
+                "price": [".item-price", ".price"],
+                "href": ["a[href]"],
+                "last_price": True,
+            },
+        ],
+    },
+    "morrisons": {
+        "base": "https://groceries.morrisons.com",
+        "layouts": [
+            {
+                "card": "div[data-retailer-anchor^='fop']",
+                "name": ["h3[data-test='fop-title']"],
+                "price": ["span[data-test='fop-price']"],
+                "href": ["a[href]"],
+            },
+            {
+                "card": "li:has(.item-name)",
+                "name": [".item-name a"],
+                "price": [".item-price"],
+                "href": ["a[href]"],
+            },
+        ],
+    },
+}
+
 # Price patterns
 _PRICE_RE = _re.compile(
     r"(?:£)\s*\d+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?\s*p\b",
     _re.IGNORECASE,
 )
+_BARE_PRICE_RE = _re.compile(r"^\s*\d+(?:\.\d{1,2})?\s*$")
 
-def get_sainsburys_results(search_query):
-    print(f"\n{'='*60}")
-    print(f"[Sainsbury's] Starting search for: {search_query!r}")
-    print(f"{'='*60}")
-    options = Options()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5993.70 Safari/537.36"
-    )
-    options.add_argument("--headless=new")
-    options.add_argument("--window-size=1920,1080")
- 
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 20)
- 
-    encoded_query = quote(search_query)
- 
-    driver.execute_cdp_cmd("Network.enable", {})
-    driver.execute_cdp_cmd("Network.setBlockedURLs", {
-        "urls": [
-            "*.png", "*.jpg", "*.jpeg", "*.webp", "*.gif", "*.svg",
-            "*.woff", "*.woff2", "*.ttf", "*.otf",
-            "*google-analytics.com/*", "*googletagmanager.com/*",
-            "*doubleclick.net/*", "*facebook.net/*", "*hotjar.com/*",
-        ]
-    })
- 
-    search_url = f"https://www.sainsburys.co.uk/gol-ui/SearchResults/{encoded_query}"
-    print(f"[Sainsbury's] Navigating to: {search_url}")
-    driver.get(search_url)
-    print(f"[Sainsbury's] Page loaded. Title: {driver.title!r}  |  HTML size: {len(driver.page_source)} chars")
-
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "a.pt__link")))
-
-    if FORCE_HEURISTIC_FALLBACK:
-        print("[Sainsbury's] FORCE_HEURISTIC_FALLBACK enabled — skipping CSS extraction.")
-        results = fallback_llm_search(driver.page_source, site='sainsburys')
-        driver.quit()
-        return results
+_BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5993.70 Safari/537.36"
+)
 
-    try:
-        wait.until(
-            EC.presence_of_all_elements_located(
-                (By.CSS_SELECTOR, "article[data-testid^='product-tile-']")
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def get_http_client() -> httpx.Client:
+    """Shared keep-alive HTTP client for the browser-free fetch path."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                timeout=httpx.Timeout(HTTP_FETCH_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={
+                    "User-Agent": _BROWSER_USER_AGENT,
+                    "Accept-Language": "en-GB,en;q=0.9",
+                },
             )
-        )
-        time.sleep(1)
-    except:
-        print("[Sainsbury's] Product grid not found — invoking LLM fallback.")
-        results = fallback_llm_search(driver.page_source, site='sainsburys')
-        driver.quit()
-        return results
- 
+        return _http_client
+
+# site -> (consecutive HTTP fetch failures, time.monotonic() of the last one)
+_http_failures: dict[str, tuple[int, float]] = {}
+_http_failures_lock = threading.Lock()
+
+def _http_first_suspended(site: str) -> bool:
+    with _http_failures_lock:
+        failures, last = _http_failures.get(site, (0, 0.0))
+    return failures >= HTTP_FIRST_MAX_FAILURES and time.monotonic() - last < HTTP_FIRST_COOLDOWN
+
+def _record_http_result(site: str, ok: bool) -> None:
+    with _http_failures_lock:
+        if ok:
+            _http_failures.pop(site, None)
+            return
+        failures, _ = _http_failures.get(site, (0, 0.0))
+        _http_failures[site] = (failures + 1, time.monotonic())
+        if failures + 1 == HTTP_FIRST_MAX_FAILURES:
+            print(f"[http_fetch] {site}: {failures + 1} failures in a row — "
+                  f"using the browser for {HTTP_FIRST_COOLDOWN:.0f}s.")
+
+def close_http_client() -> None:
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
+
+def parse_sainsburys_api(body: str) -> list[list[str]]:
+    """Parse a groceries-api product search response into [name, price, href] rows."""
+    payload = json.loads(body)
     results = []
-    try:
-        products = driver.find_elements(By.CSS_SELECTOR, "article[data-testid^='product-tile-']")
- 
-        for p in products:
-            try:
-                name_el = p.find_element(By.CSS_SELECTOR, "h2[data-testid='product-tile-description'] a")
-                name = name_el.text.strip()
-                href = name_el.get_attribute("href") or ""
-            except:
-                name = "N/A"
-                href = ""
- 
-            try:
-                price = p.find_element(
-                    By.CSS_SELECTOR, "span[data-testid='pt-retail-price']"
-                ).text.strip()
-            except:
-                price = "N/A"
- 
-            results.append([name, price, href])
- 
-    except:
-        print("[Sainsbury's] Extraction failed — invoking LLM fallback.")
-        print(driver.page_source[:3000])
-        results = fallback_llm_search(driver.page_source, site='sainsburys')
- 
-    driver.quit()
+    for product in payload.get("products") or []:
+        name = (product.get("name") or "").strip()
+        price = (product.get("retail_price") or {}).get("price")
+        href = product.get("full_url") or ""
+        if name and price is not None:
+            results.append([name, f"£{float(price):.2f}", href])
     return results
 
-def get_homebargains_results(search_query):
-    print(f"\n{'='*60}")
-    print(f"[Home Bargains] Starting search for: {search_query!r}")
-    print(f"{'='*60}")
-
-    options = Options()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--headless=new")
-    options.add_argument("--window-size=1920,1080")
+def parse_store_html(body: str, site: str) -> list[list[str]]:
+    """Parse a server-rendered search page with the store's known selectors only."""
+    soup = BeautifulSoup(body, _HTML_PARSER)
+    products = html_to_product_dicts(soup, site=site, generic_scan=False)
+    return [[p["name"], p["price"], p["href"]] for p in products]
+
+# store -> (search URL builder, response body parser)
+_HTTP_STRATEGIES = {
+    "sainsburys": (
+        lambda q: ("https://www.sainsburys.co.uk/groceries-api/gol-services/product/v1/product"
+                   f"?filter[keyword]={quote(q)}&page_number=1&page_size=60&sort_order=FAVOURITES_FIRST"),
+        parse_sainsburys_api,
+    ),
+    "homebargains": (
+        lambda q: f"https://home.bargains/search?q={quote(q)}",
+        lambda body: parse_store_html(body, "homebargains"),
+    ),
+    "morrisons": (
+        lambda q: f"https://groceries.morrisons.com/search?q={quote(q)}",
+        lambda body: parse_store_html(body, "morrisons"),
+    ),
+}
+
+def http_fetch_results(site: str, search_query: str) -> list[list[str]]:
+    """
+    Browser-free fetch of `site`'s search results.
 
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 20)
+    Returns an empty list — never raises — when the store can't be served
+    over plain HTTP, so callers fall back to the Selenium path. A store that
+    keeps failing is skipped for a while (see HTTP_FIRST_MAX_FAILURES).
+    """
+    if not HTTP_FIRST_FETCH or FORCE_HEURISTIC_FALLBACK:
+        return []
+    if site not in HTTP_FIRST_STORES or site not in _HTTP_STRATEGIES:
+        return []
+    if _http_first_suspended(site):
+        return []
+
+    build_url, parse = _HTTP_STRATEGIES[site]
+    url = build_url(search_query)
+    t0 = time.time()
+    try:
+        response = get_http_client().get(url)
+        response.raise_for_status()
+        results = parse(response.text)
+    except Exception as e:
+        print(f"[http_fetch] {site}: {type(e).__name__}: {e} — falling back to browser.")
+        _record_http_result(site, ok=False)
+        return []
+    _record_http_result(site, ok=True)
 
-    search_url = f"https://home.bargains/search?q={quote(search_query)}"
-    print(f"[Home Bargains] Navigating to: {search_url}")
-    driver.get(search_url)
-    print(f"[Home Bargains] Page loaded. Title: {driver.title!r}  |  HTML size: {len(driver.page_source)} chars")
+    if results:
+        print(f"[http_fetch] {site}: {len(results)} products over HTTP in {time.time()-t0:.1f}s")
+    else:
+        print(f"[http_fetch] {site}: no products in HTTP response — falling back to browser.")
+    return results
 
+def _save_page(site: str, search_query: str, page_source: str) -> None:
+    if not SAVE_PAGES_DIR:
+        return
+    from pathlib import Path
+    slug = _re.sub(r"[^a-z0-9]+", "_", search_query.lower()).strip("_") or "empty"
+    path = Path(SAVE_PAGES_DIR) / f"{site}-{slug}.html"
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(page_source, encoding="utf-8")
+        print(f"[save_page] Saved {site} page to {path}")
+    except OSError as e:
+        print(f"[save_page] Could not save {site} page: {e}")
+
+def _wait_for(driver, locator, timeout: float = 20, settle: float = 0) -> bool:
+    """Wait for `locator` to appear; False if it never does."""
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located(locator))
+    except TimeoutException:
+        return False
+    if settle:
+        time.sleep(settle)
+    return True
+
+def _extract_or_fallback(site: str, label: str, page_source: str, ready: bool,
+                         on_product=None) -> list[list[str]]:
+    """Parse the rendered page once; fall back to the LLM pipeline if that finds nothing."""
     if FORCE_HEURISTIC_FALLBACK:
-        print("[Home Bargains] FORCE_HEURISTIC_FALLBACK enabled — skipping CSS extraction.")
-        results = fallback_llm_search(driver.page_source, site='homebargains')
-        driver.quit()
-        return results
+        print(f"[{label}] FORCE_HEURISTIC_FALLBACK enabled — skipping CSS extraction.")
+        return fallback_llm_search(page_source, site=site, on_product=on_product)
 
-    try:
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "li.ais-Hits-item")))
-    except:
-        print("[Home Bargains] Results list not found — invoking LLM fallback.")
-        results = fallback_llm_search(driver.page_source, site='homebargains')
-        driver.quit()
+    if not ready:
+        print(f"[{label}] Product grid not found — invoking LLM fallback.")
+        return fallback_llm_search(page_source, site=site, on_product=on_product)
+
+    results = extract_page_products(page_source, site)
+    if not results:
+        print(f"[{label}] Extraction found no products — invoking LLM fallback.")
+        return fallback_llm_search(page_source, site=site, on_product=on_product)
+    return results
+
+def get_sainsburys_results(search_query, on_product=None):
+    print(f"\n{'='*60}")
+    print(f"[Sainsbury's] Starting search for: {search_query!r}")
+    print(f"{'='*60}")
+
+    results = http_fetch_results("sainsburys", search_query)
+    if results:
         return results
 
-    items = []
-    try:
-        product_cards = driver.find_elements(By.CSS_SELECTOR, "li")
+    search_url = f"https://www.sainsburys.co.uk/gol-ui/SearchResults/{quote(search_query)}"
 
-        for card in product_cards:
-            try:
-                name_el = card.find_element(By.CSS_SELECTOR, ".item-name a")
-                name = name_el.text.strip()
-            except:
-                try:
-                    name = card.find_element(By.CSS_SELECTOR, ".title").text.strip()
-                except:
-                    name = None
+    # Hold the browser only while the page renders — parsing and any LLM work happen after
+    with driver_session("sainsburys") as driver:
+        print(f"[Sainsbury's] Navigating to: {search_url}")
+        driver.get(search_url)
+        ready = (
+            _wait_for(driver, (By.CSS_SELECTOR, "a.pt__link"), timeout=10)
+            and _wait_for(driver, (By.CSS_SELECTOR, "article[data-testid^='product-tile-']"), settle=1)
+        )
+        title, page_source = driver.title, driver.page_source
 
-            try:
-                raw_price = card.find_element(By.CSS_SELECTOR, ".item-price").text.strip()
-            except:
-                try:
-                    raw_price = card.find_element(By.CSS_SELECTOR, ".price").text.strip()
-                except:
-                    raw_price = None
+    print(f"[Sainsbury's] Page loaded. Title: {title!r}  |  HTML size: {len(page_source)} chars")
+    _save_page("sainsburys", search_query, page_source)
+    return _extract_or_fallback("sainsburys", "Sainsbury's", page_source, ready, on_product)
 
-            # Handle double prices like "£3.99, £2.49" — take the last (sale) price
-            if raw_price:
-                prices = [p.strip() for p in raw_price.split(",") if p.strip()]
-                price = prices[-1] if prices else raw_price
-            else:
-                price = None
+def get_homebargains_results(search_query, on_product=None):
+    print(f"\n{'='*60}")
+    print(f"[Home Bargains] Starting search for: {search_query!r}")
+    print(f"{'='*60}")
 
-            try:
-                raw_href = card.find_element(By.CSS_SELECTOR, "a").get_attribute("href") or ""
-                href = ("https://home.bargains" + raw_href) if raw_href.startswith("/") else raw_href
-            except:
-                href = ""
+    results = http_fetch_results("homebargains", search_query)
+    if results:
+        return results
 
-            if name and price:
-                items.append([name, price, href])
+    search_url = f"https://home.bargains/search?q={quote(search_query)}"
 
-    except:
-        print("[Home Bargains] Extraction failed — invoking LLM fallback.")
-        items = fallback_llm_search(driver.page_source, site='homebargains')
+    with driver_session("homebargains") as driver:
+        print(f"[Home Bargains] Navigating to: {search_url}")
+        driver.get(search_url)
+        ready = _wait_for(driver, (By.CSS_SELECTOR, "li.ais-Hits-item"))
+        title, page_source = driver.title, driver.page_source
 
-    driver.quit()
-    return items
+    print(f"[Home Bargains] Page loaded. Title: {title!r}  |  HTML size: {len(page_source)} chars")
+    _save_page("homebargains", search_query, page_source)
+    return _extract_or_fallback("homebargains", "Home Bargains", page_source, ready, on_product)
 
-def get_morrisons_results(search_query):
+def get_morrisons_results(search_query, on_product=None):
     print(f"\n{'='*60}")
     print(f"[Morrisons] Starting search for: {search_query!r}")
     print(f"{'='*60}")
 
-    options = Options()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--headless=new")
-    options.add_argument("--window-size=1920,1080")
-
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 20)
+    results = http_fetch_results("morrisons", search_query)
+    if results:
+        return results
 
     search_url = f"https://groceries.morrisons.com/search?q={quote(search_query)}"
-    print(f"[Morrisons] Navigating to: {search_url}")
-    driver.get(search_url)
-    print(f"[Morrisons] Page loaded. Title: {driver.title!r}  |  HTML size: {len(driver.page_source)} chars")
 
-    if FORCE_HEURISTIC_FALLBACK:
-        print("[Morrisons] FORCE_HEURISTIC_FALLBACK enabled — skipping CSS extraction.")
-        results = fallback_llm_search(driver.page_source, site='morrisons')
-        driver.quit()
-        return results
+    with driver_session("morrisons") as driver:
+        print(f"[Morrisons] Navigating to: {search_url}")
+        driver.get(search_url)
+        ready = _wait_for(driver, (By.ID, "product-page"), settle=1)
+        title, page_source = driver.title, driver.page_source
 
-    try:
-        wait.until(EC.presence_of_element_located((By.ID, "product-page")))
-    except:
-        print("[Morrisons] Product page not found — invoking LLM fallback.")
-        results = fallback_llm_search(driver.page_source, site='morrisons')
-        driver.quit()
-        return results
+    print(f"[Morrisons] Page loaded. Title: {title!r}  |  HTML size: {len(page_source)} chars")
+    _save_page("morrisons", search_query, page_source)
+    return _extract_or_fallback("morrisons", "Morrisons", page_source, ready, on_product)
 
-    items = []
-    time.sleep(1)
+_BLANK_LINES_RE = _re.compile(r"\n\s*\n+")
+_SPACE_RUN_RE = _re.compile(r"[ \t]{2,}")
 
-    try:
-        product_cards = driver.find_elements(By.CSS_SELECTOR, "div[data-retailer-anchor^='fop']")
+def _collapse_whitespace(text: str) -> str:
+    return _SPACE_RUN_RE.sub(" ", _BLANK_LINES_RE.sub("\n", text))
 
-        # If no fop cards found, try Angular .item-name/.item-price structure
-        if not product_cards:
-            product_cards = driver.find_elements(By.CSS_SELECTOR, "li")
+def clean_html(html: str) -> str:
+    """
+    Strip noise tags, comments and unneeded attributes from a page for the LLM.
 
-        for card in product_cards:
-            try:
-                name = card.find_element(By.CSS_SELECTOR, "h3[data-test='fop-title']").text.strip()
-            except:
-                try:
-                    name = card.find_element(By.CSS_SELECTOR, ".item-name a").text.strip()
-                except:
-                    name = None
+    Uses lxml when installed: noise subtrees are pruned in C, then a single
+    walk filters attributes. Falls back to the BeautifulSoup implementation.
+    """
+    if _lxml_html is None:
+        return _clean_html_bs4(html)
+    if not html.strip():
+        return ""
 
-            try:
-                price = card.find_element(By.CSS_SELECTOR, "span[data-test='fop-price']").text.strip()
-            except:
-                try:
-                    price = card.find_element(By.CSS_SELECTOR, ".item-price").text.strip()
-                except:
-                    price = None
+    t0 = time.time()
+    print(f"[clean_html] Raw HTML size: {len(html):,} chars — parsing with lxml...")
 
-            try:
-                raw_href = card.find_element(By.CSS_SELECTOR, "a[href]").get_attribute("href") or ""
-                href = ("https://groceries.morrisons.com" + raw_href) if raw_href.startswith("/") else raw_href
-            except:
-                href = ""
+    parser = _lxml_html.HTMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+    root = _lxml_html.document_fromstring(html, parser=parser)
+    _etree.strip_elements(root, *_STRIP_TAGS, with_tail=False)
 
-            if name and price:
-                items.append([name, price, href])
+    for el in root.iter():
+        attrib = el.attrib
+        for name in [k for k in attrib if k not in _KEEP_ATTRS]:
+            del attrib[name]
 
-    except:
-        print("[Morrisons] Extraction failed — invoking LLM fallback.")
-        items = fallback_llm_search(driver.page_source, site='morrisons')
+    cleaned = _collapse_whitespace(_lxml_html.tostring(root, encoding="unicode"))
 
-    driver.quit()
-    return items
+    print(f"[clean_html] Done in {time.time()-t0:.2f}s — "
+          f"size: {len(cleaned):,} chars ({100*len(cleaned)/max(len(html),1):.1f}% of original)")
+    return cleaned
 
-def clean_html(html: str) -> str:
+def _clean_html_bs4(html: str) -> str:
 
     import time
     t0 = time.time()
     print(f"[clean_html] Raw HTML size: {len(html):,} chars — parsing...")
 
-    soup = BeautifulSoup(html, "html.parser")   # faster than lxml for huge pages
+    soup = BeautifulSoup(html, "html.parser")
     print(f"[clean_html] Parsed in {time.time()-t0:.1f}s — stripping noise tags...")
 
     # Remove noise tags
@@ -308,113 +456,78 @@ def clean_html(html: str) -> str:
           f"size: {len(cleaned):,} chars ({100*len(cleaned)/max(len(html),1):.1f}% of original)")
     return cleaned
 
-def html_to_product_dicts(soup: "BeautifulSoup", site: str = "unknown") -> list[dict]:
-
-    import time
-    t0 = time.time()
-    print(f"[html_to_product_dicts] Site={site!r} — trying known selectors...")
+def _first_match(card, selectors: list[str]):
+    for selector in selectors:
+        el = card.select_one(selector)
+        if el is not None:
+            return el
+    return None
 
-    results = []
+def extract_with_spec(soup: "BeautifulSoup", spec: dict) -> list[dict]:
+    """
+    Extract products with a selector spec (see _STORE_SELECTORS).
 
-    if site == "sainsburys":
-        BASE = "https://www.sainsburys.co.uk"
-
-        cards = soup.select("article[data-testid]")
-        product_cards = [c for c in cards if c.get("data-testid","").startswith("product-tile-")]
-        print(f"[html_to_product_dicts] Sainsbury's: {len(cards)} article[data-testid] tags, "
-              f"{len(product_cards)} product-tile cards")
-
-        # Debug: show a sample of data-testid values found so we can see what's there
-        all_testids = [t.get("data-testid","") for t in soup.find_all(attrs={"data-testid": True})]
-        tile_ids = [x for x in all_testids if "product" in x.lower() or "tile" in x.lower()]
-        print(f"[html_to_product_dicts] Sample data-testid values with 'product'/'tile': {tile_ids[:10]}")
-
-        for card in product_cards:
-            name_el = card.select_one('[data-testid="product-tile-description"] a')
-            price_el = (
-                card.select_one('[data-testid="contextual-price-text"]')
-                or card.select_one('[data-testid="pt-retail-price"]')
-                or card.select_one(".pt__cost--price")
-            )
-            name  = name_el.get_text(strip=True) if name_el else ""
+    Layouts are tried in order; the first one that yields products wins.
+    """
+    base = spec.get("base", "")
+    for layout in spec["layouts"]:
+        cards = soup.select(layout["card"])
+        results = []
+        for card in cards:
+            name_el = _first_match(card, layout["name"])
+            price_el = _first_match(card, layout["price"])
+            href_el = _first_match(card, layout["href"])
+            name = name_el.get_text(strip=True) if name_el else ""
             price = price_el.get_text(strip=True) if price_el else ""
-            href  = name_el.get("href", "") if name_el else ""
-            if href and not href.startswith("http"):
-                href = BASE + href
-            if name:
+            if layout.get("last_price") and price:
+                # Double prices like "£3.99, £2.49" — take the last (sale) price
+                prices = [p.strip() for p in price.split(",") if p.strip()]
+                price = prices[-1] if prices else price
+            raw_href = (href_el.get("href", "") if href_el else "") or ""
+            href = (base + raw_href) if raw_href.startswith("/") else raw_href
+            if name and (price or not layout.get("require_price", True)):
                 results.append({"name": name, "price": price, "href": href})
+        print(f"[extract_with_spec] {layout['card']!r}: {len(cards)} cards, {len(results)} products")
+        if results:
+            return results
+    return []
 
-    elif site == "homebargains":
-        BASE = "https://home.bargains"
-        cards = soup.select("li.ais-Hits-item")
-        print(f"[html_to_product_dicts] Home Bargains: {len(cards)} li.ais-Hits-item cards")
-        # Also check for Angular item-name structure
-        alt_cards = soup.select("li")
-        item_name_cards = [c for c in alt_cards if c.select_one(".item-name")]
-        print(f"[html_to_product_dicts] Home Bargains: {len(item_name_cards)} li with .item-name")
-
-        # Try ais-Hits-item first, then .item-name structure
-        search_cards = cards if cards else item_name_cards
-        for card in search_cards:
-            name_el  = (card.select_one(".item-name a")
-                        or card.select_one(".title")
-                        or card.select_one("a[href]"))
-            price_el = card.select_one(".item-price") or card.select_one(".price")
-            a_el     = card.select_one("a[href]")
-            if not (name_el and price_el):
-                continue
-            name = name_el.get_text(strip=True)
-            raw_price = price_el.get_text(strip=True)
-            prices = [p.strip() for p in raw_price.split(",") if p.strip()]
-            price = prices[-1] if prices else raw_price
-            raw_href = a_el.get("href", "") if a_el else ""
-            href = (BASE + raw_href) if raw_href.startswith("/") else raw_href
-            if name and price:
-                results.append({"name": name, "price": price, "href": href})
+def extract_page_products(page_source: str, site: str) -> list[list[str]]:
+    """Parse a rendered page once with the store's selector spec into [name, price, href] rows."""
+    t0 = time.time()
+    soup = BeautifulSoup(page_source, _HTML_PARSER)
+    products = extract_with_spec(soup, _STORE_SELECTORS[site])
+    print(f"[extract_page_products] {site}: {len(products)} products in {time.time()-t0:.2f}s")
+    return [[p["name"], p["price"], p["href"]] for p in products]
 
-    elif site == "morrisons":
-        BASE = "https://groceries.morrisons.com"
-        fop_cards = soup.select("div[data-retailer-anchor]")
-        product_fops = [c for c in fop_cards if c.get("data-retailer-anchor","").startswith("fop")]
-        print(f"[html_to_product_dicts] Morrisons: {len(fop_cards)} div[data-retailer-anchor], "
-              f"{len(product_fops)} fop cards")
-
-        # Debug: show sample retailer-anchor values
-        anchors = [c.get("data-retailer-anchor","") for c in fop_cards[:10]]
-        print(f"[html_to_product_dicts] Sample data-retailer-anchor values: {anchors}")
-
-        for card in product_fops:
-            name_el  = card.select_one("h3[data-test='fop-title']")
-            price_el = card.select_one("span[data-test='fop-price']")
-            a_el     = card.select_one("a[href]")
-            name  = name_el.get_text(strip=True) if name_el else ""
-            price = price_el.get_text(strip=True) if price_el else ""
-            raw_href = a_el.get("href", "") if a_el else ""
-            href = (BASE + raw_href) if raw_href.startswith("/") else raw_href
-            if name and price:
-                results.append({"name": name, "price": price, "href": href})
+def html_to_product_dicts(soup: "BeautifulSoup", site: str = "unknown", generic_scan: bool = True) -> list[dict]:
 
-        if not results:
-            # Angular .item-name/.item-price fallback
-            item_cards = [li for li in soup.select("li") if li.select_one(".item-name")]
-            print(f"[html_to_product_dicts] Morrisons Angular fallback: {len(item_cards)} .item-name cards")
-            for card in item_cards:
-                name_el  = card.select_one(".item-name a")
-                price_el = card.select_one(".item-price")
-                a_el     = card.select_one("a[href]")
-                if not (name_el and price_el):
-                    continue
-                name  = name_el.get_text(strip=True)
-                price = price_el.get_text(strip=True)
-                raw_href = a_el.get("href", "") if a_el else ""
-                href = (BASE + raw_href) if raw_href.startswith("/") else raw_href
-                if name and price:
-                    results.append({"name": name, "price": price, "href": href})
+    import time
+    t0 = time.time()
+    print(f"[html_to_product_dicts] Site={site!r} — trying known selectors...")
+
+    results = extract_with_spec(soup, _STORE_SELECTORS[site]) if site in _STORE_SELECTORS else []
+
+    if not results:
+        # Selectors learned from earlier LLM extractions of a redesigned layout
+        for spec in _load_learned_selectors(site):
+            results = extract_with_spec(soup, spec)
+            if results:
+                print(f"[html_to_product_dicts] Learned selectors matched {len(results)} products")
+                try:
+                    mark_learned_selectors_used(site, spec)
+                except Exception as e:
+                    print(f"[html_to_product_dicts] Could not update learned selectors: {e}")
+                break
 
     if results:
         print(f"[html_to_product_dicts] Known selectors found {len(results)} products in {time.time()-t0:.1f}s")
         return results
 
+    if not generic_scan:
+        print(f"[html_to_product_dicts] No results from known selectors — generic scan disabled.")
+        return results
+
     print(f"[html_to_product_dicts] No results from known selectors — trying generic scan...")
 
     # Non-product patterns to skip
@@ -457,6 +570,111 @@ def html_to_product_dicts(soup: "BeautifulSoup", site: str = "unknown") -> list[
     print(f"[html_to_product_dicts] Generic scan found {len(results)} candidates in {time.time()-t0:.1f}s")
     return results
 
+_CSS_IDENT_RE = _re.compile(r"^-?[A-Za-z_][A-Za-z0-9_-]*$")
+_STABLE_ATTRS = ("data-testid", "data-test", "data-retailer-anchor")
+_MIN_LEARN_PRODUCTS = 3
+_MIN_LEARN_RECALL = 0.6
+
+def _common_selector(elements: list) -> Optional[str]:
+    """A tag + class/attribute selector that every element in `elements` matches."""
+    tags = {el.name for el in elements}
+    if len(tags) != 1:
+        return None
+    selector = tags.pop()
+
+    classes = set.intersection(*(set(el.get("class") or []) for el in elements))
+    selector += "".join(f".{c}" for c in sorted(classes) if _CSS_IDENT_RE.match(c))
+
+    for attr in _STABLE_ATTRS:
+        values = [el.get(attr) for el in elements]
+        if any(v is None for v in values):
+            continue
+        prefix = os.path.commonprefix(values)
+        if len(set(values)) == 1:
+            selector += f'[{attr}="{prefix}"]'
+        elif prefix:
+            selector += f'[{attr}^="{prefix}"]'
+        else:
+            selector += f"[{attr}]"
+        break
+    return selector
+
+def learn_selectors(soup: "BeautifulSoup", products: list[list[str]], site: str) -> Optional[dict]:
+    """
+    Derive a selector spec (same shape as _STORE_SELECTORS) from products the
+    LLM extracted out of `soup`.
+
+    Each product's name is located on the page, its card is the nearest
+    ancestor that also contains its price, and the selectors are whatever
+    those cards / name / price elements have in common. The spec is only
+    returned if re-running it recovers most of the LLM's products.
+    """
+    text_parents: dict[str, object] = {}
+    for string in soup.find_all(string=True):
+        text_parents.setdefault(string.strip(), string.parent)
+
+    cards, names, prices = [], [], []
+    for name, price, _ in products:
+        name_el = text_parents.get((name or "").strip())
+        if name_el is None or not price:
+            continue
+        card = next((a for a in name_el.parents if price in a.get_text(" ", strip=True)), None)
+        if card is None or card.name in ("html", "body", "[document]"):
+            continue
+        price_el = next((s.parent for s in card.find_all(string=True) if price in s), None)
+        if price_el is None:
+            continue
+        cards.append(card)
+        names.append(name_el)
+        prices.append(price_el)
+
+    if len(cards) < _MIN_LEARN_PRODUCTS:
+        return None
+
+    card_selector = _common_selector(cards)
+    name_selector = _common_selector(names)
+    price_selector = _common_selector(prices)
+    # A bare tag is far too broad to identify a product card
+    if not (card_selector and name_selector and price_selector) or _CSS_IDENT_RE.match(card_selector):
+        return None
+
+    spec = {
+        "base": _STORE_SELECTORS.get(site, {}).get("base", ""),
+        "layouts": [{
+            "card": card_selector,
+            "name": [name_selector],
+            "price": [price_selector],
+            "href": ["a[href]"],
+        }],
+    }
+    found = {p["name"] for p in extract_with_spec(soup, spec)}
+    wanted = {name for name, _, _ in products if name}
+    recall = len(found & wanted) / max(len(wanted), 1)
+    if recall < _MIN_LEARN_RECALL:
+        print(f"[learn_selectors] {site}: derived spec only recovers {recall:.0%} of products — discarded.")
+        return None
+
+    print(f"[learn_selectors] {site}: learned card={card_selector!r} name={name_selector!r} "
+          f"price={price_selector!r} ({recall:.0%} recall)")
+    return spec
+
+def _load_learned_selectors(site: str) -> list[dict]:
+    try:
+        return get_learned_selectors(site)
+    except Exception as e:
+        print(f"[learn_selectors] Could not read learned selectors for {site}: {e}")
+        return []
+
+def _remember_extraction(raw_html: str, site: str, cache_key: str, model: str, results: list[list[str]]) -> None:
+    """Cache a successful LLM extraction and try to learn selectors from it."""
+    try:
+        store_extraction(cache_key, site, model, results)
+        spec = learn_selectors(BeautifulSoup(raw_html, _HTML_PARSER), results, site)
+        if spec:
+            store_learned_selectors(site, spec)
+    except Exception as e:
+        print(f"[fallback] Could not cache LLM extraction: {e}")
+
 def toon_encode(data: list[dict], delimiter: str = ",") -> str:
     """
     Encode a list of uniform dicts as a TOON tabular array.
@@ -490,24 +708,25 @@ def toon_encode(data: list[dict], delimiter: str = ",") -> str:
 def encode_for_llm(raw_html: str, site: str = "unknown") -> tuple[str, str, list[dict]]:
     """
     Pipeline:
-      1. Parse once, strip noise tags (keeps all attrs intact)
-      2. Unless FORCE_LLM_HEURISTIC_BYPASS, run heuristic with full attrs
-      3. If heuristic finds products → return directly (no LLM)
-      4. Otherwise strip attrs, send cleaned HTML to LLM
+      1. Unless FORCE_LLM_HEURISTIC_BYPASS, parse once, strip noise tags and
+         run the heuristic with all attrs intact
+      2. If heuristic finds products → return directly (no LLM)
+      3. Otherwise clean the raw page with clean_html and send that to the LLM
     """
     import time
     t0 = time.time()
 
     print(f"[encode_for_llm] Starting pipeline — site={site!r}, input={len(raw_html):,} chars...")
-    soup = BeautifulSoup(raw_html, "html.parser")
-
-    # Strip noise tags only — keep ALL attributes so selectors work
-    for tag in soup.find_all(_STRIP_TAGS):
-        tag.decompose()
-    print(f"[encode_for_llm] Noise tags removed in {time.time()-t0:.1f}s")
 
     # Run heuristic while attrs are intact (unless bypassed for LLM testing)
     if not FORCE_LLM_HEURISTIC_BYPASS:
+        soup = BeautifulSoup(raw_html, _HTML_PARSER)
+
+        # Strip noise tags only — keep ALL attributes so selectors work
+        for tag in soup.find_all(_STRIP_TAGS):
+            tag.decompose()
+        print(f"[encode_for_llm] Noise tags removed in {time.time()-t0:.1f}s")
+
         products = html_to_product_dicts(soup, site=site)
         if products:
             toon = toon_encode(products)
@@ -517,38 +736,13 @@ def encode_for_llm(raw_html: str, site: str = "unknown") -> tuple[str, str, list
     else:
         print(f"[encode_for_llm] FORCE_LLM_HEURISTIC_BYPASS — skipping heuristic, going straight to LLM")
 
-    # Strip attrs now for the LLM payload
-    for tag in soup.find_all(True):
-        tag.attrs = {k: v for k, v in tag.attrs.items() if k in _KEEP_ATTRS}
-
-    cleaned = str(soup)
-    cleaned = _re.sub(r"\n\s*\n+", "\n", cleaned)
-    cleaned = _re.sub(r"[ \t]{2,}", " ", cleaned)
+    # The lxml cleaner re-parses the page far faster than stripping attrs
+    # from the soup and serialising it
+    cleaned = clean_html(raw_html)
     print(f"[encode_for_llm] Sending cleaned HTML to LLM ({len(cleaned):,} chars, {time.time()-t0:.1f}s)")
     return cleaned, "html", []
 
-def fallback_llm_search(raw_html: str, model: str = DEFAULT_MODEL, site: str = "unknown") -> list[list[str]]:
-    """
-    Full pipeline: raw HTML → heuristic extraction → (LLM only if heuristic fails)
-
-    If html_to_product_dicts finds products via known selectors, returns them
-    directly without any LLM call. LLM is only invoked as a last resort when
-    the heuristic finds nothing (e.g. site has been redesigned).
-    """
-    payload, fmt, heuristic_products = encode_for_llm(raw_html, site=site)
-    
-    # Short-circuit: heuristic succeeded — no LLM needed
-    if heuristic_products:
-        print(f"[fallback] Heuristic returned {len(heuristic_products)} products — skipping LLM.")
-        results = [[p["name"], p["price"], p["href"]] for p in heuristic_products]
-        print("[fallback] Final results:")
-        for i, r in enumerate(results):
-            print(f"  [{i+1}] name={r[0]!r}  price={r[1]!r}  href={r[2]!r}")
-        return results
-
-    # Heuristic found nothing — send cleaned HTML to LLM
-    print(f"[fallback] Heuristic empty — invoking LLM on {len(payload):,} char payload...")
-
+def _build_prompt(payload: str, fmt: str) -> str:
     if fmt == "toon":
         format_description = (
             "TOON tabular format (a compact encoding of uniform objects).\n"
@@ -579,7 +773,7 @@ HTML:
 
 Output:
 [
- {"name":"Cherry Tomatoes","price":"£2.50","href":"/product/1"}
+ {{"name":"Cherry Tomatoes","price":"£2.50","href":"/product/1"}}
 ]
 
 HTML:
@@ -589,90 +783,379 @@ HTML:
 
 Output:
 [
- {"name":"Morrisons Salad Tomatoes","price":"£0.99","href":"/products/morrisons-salad-tomatoes/108389100"}
+ {{"name":"Morrisons Salad Tomatoes","price":"£0.99","href":"/products/morrisons-salad-tomatoes/108389100"}}
 ]
 
 DATA:
 {payload}
 """
- 
-    def call_model(m: str) -> list[list[str]]:
-        import traceback
-        print(f"\n[LLM] Sending prompt to {m}...")
-        print(f"[LLM] Format: {fmt.upper()}  |  Payload: {len(payload):,} chars  |  Prompt: {len(prompt):,} chars")
-        print("-" * 60)
-
-        # Single non-streaming call — simpler and avoids chunk assembly bugs
-        response = ollama.chat(
-            model=m,
-            messages=[{"role": "user", "content": prompt}],
-            stream=False,
-        )
-        raw = response["message"]["content"].strip()
-
-        print(f"[LLM] Raw response from {m} ({len(raw):,} chars):")
-        print("=" * 60)
-        print(raw[:2000])  # cap console spam but always show start
-        if len(raw) > 2000:
-            print(f"... [{len(raw)-2000:,} more chars]")
-        print("=" * 60)
-
-        if not raw:
-            raise ValueError("LLM returned an empty response")
-
-        # Strip accidental markdown fences — handle ```json ... ``` or ``` ... ```
-        clean = raw
-        if clean.startswith("```"):
-            print("[LLM] Stripping markdown fences...")
-            clean = _re.sub(r"^```[a-zA-Z]*\n?", "", clean)
-            clean = _re.sub(r"\n?```$", "", clean).strip()
-            print(f"[LLM] After fence strip: {clean[:200]}")
-
-        # Extract the JSON array even if the model prepended/appended prose
-        bracket_start = clean.find("[")
-        bracket_end   = clean.rfind("]")
-        if bracket_start != -1 and bracket_end != -1 and bracket_end > bracket_start:
-            if bracket_start > 0 or bracket_end < len(clean) - 1:
-                print(f"[LLM] Extracting JSON array from pos {bracket_start}:{bracket_end+1}")
-            clean = clean[bracket_start : bracket_end + 1]
-
-        print("[LLM] Parsing JSON...")
-        try:
-            parsed = json.loads(clean)
-        except json.JSONDecodeError as e:
+    return prompt
+
+class _ProductStreamParser:
+    """
+    Pulls product objects out of a JSON array as it streams in.
+
+    Text before the array (prose, markdown fences) is skipped; the array
+    starts at the first "[" followed by "{" or "]", so brackets in a
+    preamble ("Here [are] the products: [...") aren't mistaken for it. Each
+    complete {...} element is returned as soon as its closing brace
+    arrives; `closed` flips once the array's "]" is seen.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self._decoder = json.JSONDecoder()
+        self.closed = False
+
+    def feed(self, text: str) -> list[dict]:
+        self._buffer += text
+        buf = self._buffer
+        items = []
+        if not self._started:
+            start = buf.find("[", self._pos)
+            while start != -1:
+                i = start + 1
+                while i < len(buf) and buf[i] in " \t\r\n":
+                    i += 1
+                if i >= len(buf):
+                    self._pos = start  # can't tell yet — wait for more tokens
+                    return items
+                if buf[i] in "{]":
+                    break
+                start = buf.find("[", start + 1)
+            if start == -1:
+                self._pos = len(buf)
+                return items
+            self._pos = start + 1
+            self._started = True
+
+        while not self.closed:
+            i = self._pos
+            while i < len(buf) and buf[i] in " \t\r\n,":
+                i += 1
+            self._pos = i
+            if i >= len(buf):
+                break
+            if buf[i] == "]":
+                self.closed = True
+                break
+            if buf[i] != "{":
+                # Stray token between elements — skip it
+                self._pos = i + 1
+                continue
+            try:
+                item, end = self._decoder.raw_decode(buf, i)
+            except json.JSONDecodeError:
+                break  # element not complete yet — wait for more tokens
+            self._pos = end
+            if isinstance(item, dict):
+                items.append(item)
+        return items
+
+class _LLMOutputError(ValueError):
+    """The model answered, but not with usable products — worth a retry on the same model."""
+
+def _validate_product(item: dict) -> Optional[list[str]]:
+    """[name, price, href] if `item` looks like a real product, else None."""
+    name, price, href = item.get("name"), item.get("price"), item.get("href") or ""
+    if isinstance(price, str) and _BARE_PRICE_RE.match(price):
+        price = float(price)  # the schema only asks for a string, so "1.50" is a fair answer
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        price = f"£{price:.2f}"
+    if not (isinstance(name, str) and isinstance(price, str) and isinstance(href, str)):
+        return None
+    name, price = name.strip(), price.strip()
+    if not name or not _PRICE_RE.search(price):
+        return None
+    return [name, price, href.strip()]
+
+def _parse_llm_json(raw: str) -> list[list[str]]:
+    """Recover a JSON array of products from a complete (possibly messy) response."""
+    # Strip accidental markdown fences — handle ```json ... ``` or ``` ... ```
+    clean = raw
+    if clean.startswith("```"):
+        print("[LLM] Stripping markdown fences...")
+        clean = _re.sub(r"^```[a-zA-Z]*\n?", "", clean)
+        clean = _re.sub(r"\n?```$", "", clean).strip()
+        print(f"[LLM] After fence strip: {clean[:200]}")
+
+    # Extract the JSON array even if the model prepended/appended prose
+    bracket_start = clean.find("[")
+    bracket_end   = clean.rfind("]")
+    if bracket_start != -1 and bracket_end != -1 and bracket_end > bracket_start:
+        if bracket_start > 0 or bracket_end < len(clean) - 1:
+            print(f"[LLM] Extracting JSON array from pos {bracket_start}:{bracket_end+1}")
+        clean = clean[bracket_start : bracket_end + 1]
+
+    print("[LLM] Parsing JSON...")
+    try:
+        parsed = json.loads(clean)
+    except json.JSONDecodeError as e:
+        parsed = _find_json_array(raw)
+        if parsed is None:
             print(f"[LLM] JSON parse error: {e}")
             print(f"[LLM] Offending text around error:\n{clean[max(0,e.pos-100):e.pos+100]}")
             raise
+        print("[LLM] Found a valid JSON array after skipping malformed text.")
+
+    print(f"[LLM] JSON parsed OK — {len(parsed)} items found.")
+    return [
+        [item.get("name", ""), item.get("price", ""), item.get("href", "")]
+        for item in parsed
+        if isinstance(item, dict)
+    ]
+
+def _find_json_array(raw: str) -> Optional[list]:
+    """First "[" in `raw` that decodes to an array of objects, e.g. after a bracketed preamble."""
+    decoder = json.JSONDecoder()
+    start = raw.find("[")
+    while start != -1:
+        try:
+            parsed, _ = decoder.raw_decode(raw, start)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(parsed, list) and any(isinstance(item, dict) for item in parsed):
+                return parsed
+        start = raw.find("[", start + 1)
+    return None
+
+def _call_model(m: str, prompt: str, label: str = "", on_product=None) -> list[list[str]]:
+    """
+    Stream `prompt` through model `m`, handing each product to `on_product`
+    as soon as it is parsed. Generation is cancelled once the array closes
+    or LLM_MAX_PRODUCTS products have arrived.
+    """
+    print(f"\n[LLM]{label} Streaming prompt to {m} ({len(prompt):,} chars)...")
+    t0 = time.time()
 
-        print(f"[LLM] JSON parsed OK — {len(parsed)} items found.")
-        results = [
-            [item.get("name", ""), item.get("price", ""), item.get("href", "")]
-            for item in parsed
-            if isinstance(item, dict)
-        ]
-        print("[LLM] Extracted results:")
+    parser = _ProductStreamParser()
+    results = []
+    chunks = []
+    rejected = 0
+    stream = ollama.chat(
+        model=m,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+        format=PRODUCTS_SCHEMA if STRUCTURED_OUTPUT else None,
+    )
+    try:
+        for part in stream:
+            text = part["message"]["content"]
+            chunks.append(text)
+            for item in parser.feed(text):
+                row = _validate_product(item)
+                if row is None:
+                    rejected += 1
+                    continue
+                results.append(row)
+                if on_product is not None:
+                    on_product(row)
+            if parser.closed or len(results) >= LLM_MAX_PRODUCTS:
+                print(f"[LLM]{label} {'Array closed' if parser.closed else 'Product cap reached'} "
+                      f"after {time.time()-t0:.1f}s — cancelling generation.")
+                break
+    finally:
+        # Closing the stream drops the HTTP connection, which stops Ollama generating
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+    raw = "".join(chunks).strip()
+    print(f"[LLM]{label} {m} streamed {len(raw):,} chars, {len(results)} products in {time.time()-t0:.1f}s:")
+    print("=" * 60)
+    print(raw[:2000])  # cap console spam but always show start
+    if len(raw) > 2000:
+        print(f"... [{len(raw)-2000:,} more chars]")
+    print("=" * 60)
+
+    if not raw:
+        raise _LLMOutputError("LLM returned an empty response")
+
+    if not results and not parser.closed:
+        # Nothing parsed incrementally — fall back to whole-response recovery
+        try:
+            parsed = _parse_llm_json(raw)
+        except json.JSONDecodeError as e:
+            raise _LLMOutputError(f"unparseable JSON: {e}") from e
+        results = [row for row in (_validate_product(dict(zip(("name", "price", "href"), r))) for r in parsed) if row]
+        rejected += len(parsed) - len(results)
+        if on_product is not None:
+            for row in results:
+                on_product(row)
+
+    if rejected:
+        print(f"[LLM]{label} Dropped {rejected} item(s) that failed validation.")
+        if not results:
+            raise _LLMOutputError(f"all {rejected} items failed validation")
+
+    print("[LLM] Extracted results:")
+    for i, r in enumerate(results):
+        print(f"  [{i+1}] name={r[0]!r}  price={r[1]!r}  href={r[2]!r}")
+    return results
+
+def chunk_html(cleaned: str, max_chars: int) -> list[str]:
+    """
+    Split cleaned HTML into chunks of at most ~max_chars for the LLM.
+
+    Elements that fit the budget are kept whole (so product cards aren't cut
+    in half), bigger ones are split along their children; the text between
+    those children is kept as pieces of its own. Regions without
+    anything that looks like a price are dropped, and consecutive regions
+    are packed together up to the budget.
+    """
+    if len(cleaned) <= max_chars:
+        return [cleaned]
+
+    pieces = []
+    if _lxml_html is not None:
+        def text_piece(text):
+            if text and text.strip():
+                pieces.append(_html_escape(text.strip(), quote=False)[:max_chars])
+
+        def visit(el, with_tail):
+            html = _lxml_html.tostring(el, encoding="unicode", with_tail=with_tail)
+            children = list(el)
+            if len(html) <= max_chars or not children:
+                pieces.append(html[:max_chars])
+                return
+            text_piece(el.text)
+            for child in children:
+                visit(child, with_tail=True)
+            if with_tail:
+                text_piece(el.tail)
+
+        root = _lxml_html.document_fromstring(cleaned)
+        body = root.find("body")
+        visit(body if body is not None else root, with_tail=False)
+    else:
+        pieces = [cleaned[i:i + max_chars] for i in range(0, len(cleaned), max_chars)]
+
+    chunks, current = [], []
+    size = 0
+    for piece in pieces:
+        if not _PRICE_RE.search(piece):
+            continue
+        if current and size + len(piece) > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _extract_chunk(chunk: str, fmt: str, model: str, label: str, on_product=None) -> list[list[str]]:
+    """
+    Run one chunk through the model.
+
+    Unusable output (bad JSON, items failing validation) is retried on the
+    same model up to LLM_OUTPUT_RETRIES times. Only real errors — model
+    missing, Ollama down, server errors — move on to FALLBACK_MODEL.
+    """
+    prompt = _build_prompt(chunk, fmt)
+    for attempt_model in [model, FALLBACK_MODEL]:
+        for attempt in range(1 + LLM_OUTPUT_RETRIES):
+            try:
+                print(f"\n[LLM fallback]{label} Trying model: {attempt_model} (attempt {attempt + 1})")
+                results = _call_model(attempt_model, prompt, label, on_product=on_product)
+                print(f"[LLM fallback]{label} ✓ Extracted {len(results)} products via {attempt_model}.")
+                return results
+            except _LLMOutputError as e:
+                print(f"[LLM fallback]{label} {attempt_model} gave unusable output: {e}")
+            except Exception as e:
+                import traceback
+                print(f"[LLM fallback]{label} ✗ {attempt_model} failed: {e} — trying next model.")
+                traceback.print_exc()
+                break
+        else:
+            print(f"[LLM fallback]{label} Giving up on this chunk after {1 + LLM_OUTPUT_RETRIES} attempts.")
+            return []
+    return []
+
+def fallback_llm_search(raw_html: str, model: str = DEFAULT_MODEL, site: str = "unknown",
+                        on_product=None) -> list[list[str]]:
+    """
+    Full pipeline: raw HTML → heuristic extraction → (LLM only if heuristic fails)
+
+    If html_to_product_dicts finds products via known selectors, returns them
+    directly without any LLM call. LLM is only invoked as a last resort when
+    the heuristic finds nothing (e.g. site has been redesigned).
+
+    on_product: optional callback([name, price, href]) fired for each
+                product as the LLM streams it, before the full list returns.
+    """
+    payload, fmt, heuristic_products = encode_for_llm(raw_html, site=site)
+    
+    # Short-circuit: heuristic succeeded — no LLM needed
+    if heuristic_products:
+        print(f"[fallback] Heuristic returned {len(heuristic_products)} products — skipping LLM.")
+        results = [[p["name"], p["price"], p["href"]] for p in heuristic_products]
+        print("[fallback] Final results:")
         for i, r in enumerate(results):
             print(f"  [{i+1}] name={r[0]!r}  price={r[1]!r}  href={r[2]!r}")
         return results
 
-    # Try primary model, then fallback model
-    for attempt_model in [model, FALLBACK_MODEL]:
-        try:
-            print(f"\n[LLM fallback] Trying model: {attempt_model}")
-            results = call_model(attempt_model)
-            if results:
-                print(f"[LLM fallback] ✓ Successfully extracted {len(results)} products via {attempt_model}.")
-                return results
-            else:
-                print(f"[LLM fallback] {attempt_model} returned no results — trying next model.")
-        except Exception as e:
-            import traceback
-            print(f"[LLM fallback] ✗ {attempt_model} failed: {e}")
-            traceback.print_exc()
+    # Same cleaned page seen before — reuse the earlier LLM extraction
+    cache_key = payload_hash(site, payload)
+    try:
+        cached = get_cached_extraction(cache_key)
+    except Exception as e:
+        print(f"[fallback] LLM cache read failed: {e}")
+        cached = None
+    if cached:
+        print(f"[fallback] LLM cache hit ({cache_key[:12]}) — {len(cached)} products, skipping LLM.")
+        return cached
+
+    # Heuristic found nothing — send cleaned HTML to LLM, one product region chunk at a time
+    chunks = chunk_html(payload, LLM_CHUNK_TOKENS * _CHARS_PER_TOKEN) if fmt == "html" else [payload]
+    print(f"[fallback] Heuristic empty — invoking LLM on {len(payload):,} char payload "
+          f"in {len(chunks)} chunk(s) (largest {max((len(c) for c in chunks), default=0):,} chars)...")
+
+    # Chunks (and model retries) can repeat a product — only announce each one once
+    announced = set()
+    announce_lock = threading.Lock()
+
+    def announce(row):
+        key = (row[0].strip().lower(), row[1].strip())
+        with announce_lock:
+            if not row[0] or key in announced:
+                return
+            announced.add(key)
+        on_product(row)
+
+    merged: dict[tuple, list[str]] = {}
+    workers = max(1, min(LLM_MAX_WORKERS, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_extract_chunk, chunk, fmt, model, f"[{i+1}/{len(chunks)}]",
+                            announce if on_product is not None else None)
+            for i, chunk in enumerate(chunks)
+        ]
+        # Keep page order: chunk by chunk, first occurrence of each product wins
+        for future in futures:
+            for row in future.result():
+                key = (row[0].strip().lower(), row[1].strip())
+                if row[0] and key not in merged:
+                    merged[key] = row
+
+    results = list(merged.values())
+    if results:
+        print(f"[LLM fallback] ✓ Extracted {len(results)} unique products from {len(chunks)} chunk(s).")
+        _remember_extraction(raw_html, site, cache_key, model, results)
+        return results
 
     print("[LLM fallback] All models failed. Returning empty list.")
     return []
 
+STORE_CRAWLERS = {
+    "sainsburys":   get_sainsburys_results,
+    "homebargains": get_homebargains_results,
+    "morrisons":    get_morrisons_results,
+}
+
 def search_all(query, on_result=None):
     """
     Run all three crawlers concurrently.
@@ -680,15 +1163,21 @@ def search_all(query, on_result=None):
     on_result: optional callback(store_name, results) fired as each store
                finishes — use this so your display page can render results
                immediately instead of waiting for all three to complete.
+               When a store falls back to the LLM it also fires with the
+               products streamed so far, so each call carries that store's
+               latest (growing) list and the last call the final one.
     """
-    crawlers = {
-        "sainsburys":   lambda: get_sainsburys_results(query),
-        "homebargains": lambda: get_homebargains_results(query),
-        "morrisons":    lambda: get_morrisons_results(query),
-    }
     results = {}
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = {executor.submit(fn): name for name, fn in crawlers.items()}
+    with ThreadPoolExecutor(max_workers=len(STORE_CRAWLERS)) as executor:
+        futures = {}
+        for name, fn in STORE_CRAWLERS.items():
+            on_product = None
+            if on_result is not None:
+                partial = []
+                def on_product(row, name=name, partial=partial):
+                    partial.append(row)
+                    on_result(name, list(partial))
+            futures[executor.submit(fn, query, on_product)] = name
         for future in as_completed(futures):   # fires as each store finishes, not all at once
             name = futures[future]
             try:
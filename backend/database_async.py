@@ -0,0 +1,319 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiomysql
+
+from .database_ops import (
+    SEARCHES_INSERT,
+    SEARCH_REPRESENTATIVE,
+    SEARCH_VARIANTS_UPSERT,
+    SEARCH_WORD_SCORE,
+    SEARCH_WORD_STATS_UPSERT,
+    _credentials_error,
+    search_write_params,
+)
+from .db_pool import DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME, DB_POOL_SIZE, DB_POOL_RECYCLE
+from .password_hashing import hash_password, needs_rehash, verify_password
+from .query_canon import display_query
+
+# Async mirror of the user and search functions in database_ops, on an
+# aiomysql pool, for the FastAPI handlers. A request waiting on MySQL then
+# costs a suspended coroutine instead of a threadpool thread.
+#
+# Connections run in autocommit mode: aiomysql closes rather than reuses a
+# connection released mid-transaction, so multi-statement writes open
+# their own transaction with begin()/commit(). The price store functions
+# stay in database_ops; they're called from crawler threads.
+#
+# Per-user top searches are kept in a small LRU in front of
+# search_word_stats. Writes through insert_search_rows drop the affected
+# users' entries; the TTL bounds how stale the decayed ranking can get.
+
+DB_ASYNC_POOL_MIN = 1
+
+TOP_SEARCH_CACHE_SIZE = int(os.environ.get("TOP_SEARCH_CACHE_SIZE", "10000"))
+TOP_SEARCH_CACHE_TTL = float(os.environ.get("TOP_SEARCH_CACHE_TTL", "600"))
+
+_pool: Optional[aiomysql.Pool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def init_async_pool() -> None:
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await aiomysql.create_pool(
+                host=DB_HOST,
+                port=DB_PORT,
+                user=DB_USER,
+                password=DB_PASSWORD,
+                db=DB_NAME,
+                minsize=DB_ASYNC_POOL_MIN,
+                maxsize=max(DB_ASYNC_POOL_MIN, DB_POOL_SIZE),
+                pool_recycle=int(DB_POOL_RECYCLE),
+                autocommit=True,
+                cursorclass=aiomysql.DictCursor,
+            )
+
+
+async def close_async_pool() -> None:
+    global _pool
+    async with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+        await pool.wait_closed()
+
+
+@asynccontextmanager
+async def get_connection():
+    if _pool is None:
+        await init_async_pool()
+    async with _pool.acquire() as connection:
+        yield connection
+
+
+async def _fetchall(query: str, args=()) -> list[dict]:
+    async with get_connection() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, args)
+            return await cursor.fetchall()
+
+
+async def _fetchone(query: str, args=()) -> Optional[dict]:
+    async with get_connection() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, args)
+            return await cursor.fetchone()
+
+
+async def _execute(query: str, args=()) -> int:
+    async with get_connection() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, args)
+            return cursor.rowcount
+
+
+class TopSearchCache:
+    """LRU of (user_id, limit) -> top search words, with a TTL."""
+
+    def __init__(self, size: int = TOP_SEARCH_CACHE_SIZE, ttl: float = TOP_SEARCH_CACHE_TTL):
+        self.size = max(1, size)
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()  # key -> (expires_at, words)
+        self._by_user: dict[int, set] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, limit: int) -> Optional[list[str]]:
+        entry = self._entries.get((user_id, limit))
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end((user_id, limit))
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user_id: int, limit: int, words: list[str]) -> None:
+        self._entries[(user_id, limit)] = (time.monotonic() + self.ttl, words)
+        self._entries.move_to_end((user_id, limit))
+        self._by_user.setdefault(user_id, set()).add(limit)
+        while len(self._entries) > self.size:
+            (old_user, old_limit), _ = self._entries.popitem(last=False)
+            self._forget(old_user, old_limit)
+
+    def _forget(self, user_id: int, limit: int) -> None:
+        limits = self._by_user.get(user_id)
+        if limits is not None:
+            limits.discard(limit)
+            if not limits:
+                del self._by_user[user_id]
+
+    def invalidate(self, user_ids) -> None:
+        for user_id in set(user_ids):
+            for limit in self._by_user.pop(user_id, ()):
+                self._entries.pop((user_id, limit), None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+top_search_cache = TopSearchCache()
+
+# User Operations
+
+async def insert_user(email: str, password: str) -> int:
+    hashed_password = await hash_password(password)
+    query = """
+        INSERT INTO users (email, hashed_password)
+        VALUES (%s, %s)
+    """
+    async with get_connection() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(query, (email, hashed_password))
+            return cursor.lastrowid
+
+async def update_user(user_id: int, email: str = None, password: str = None) -> bool:
+    fields = []
+    params = []
+
+    if email is not None:
+        fields.append("email = %s")
+        params.append(email)
+
+    if password is not None:
+        fields.append("hashed_password = %s")
+        params.append(await hash_password(password))
+
+    if not fields:
+        return False
+
+    params.append(user_id)
+
+    query = f"""
+        UPDATE users
+        SET {', '.join(fields)}, updated_at = NOW()
+        WHERE user_id = %s
+    """
+    await _execute(query, tuple(params))
+    return True
+
+async def delete_user(user_id: int) -> bool:
+    await _execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+    return True
+
+async def get_user_by_email(email: str) -> Optional[dict]:
+    return await _fetchone("SELECT * FROM users WHERE email = %s", (email,))
+
+async def update_password_hash(user_id: int, hashed_password: str) -> None:
+    await _execute("UPDATE users SET hashed_password = %s WHERE user_id = %s", (hashed_password, user_id))
+
+async def insert_user_if_new(email: str, hashed_password: str) -> Optional[int]:
+    """Insert the user in one transaction; None if the email is taken."""
+    async with get_connection() as connection:
+        await connection.begin()
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute("SELECT user_id FROM users WHERE email = %s FOR UPDATE", (email,))
+                if await cursor.fetchone() is not None:
+                    await connection.rollback()
+                    return None
+                await cursor.execute(
+                    "INSERT INTO users (email, hashed_password) VALUES (%s, %s)",
+                    (email, hashed_password),
+                )
+                user_id = cursor.lastrowid
+            await connection.commit()
+        except BaseException:
+            await connection.rollback()
+            raise
+        return user_id
+
+# Search Operations
+
+async def insert_search_match(user_id: int, search_words: list[str]) -> int:
+    rows = [(user_id, word, 1) for word in dict.fromkeys(map(display_query, search_words)) if word]
+    return await insert_search_rows(rows)
+
+async def insert_search_rows(rows: list[tuple[int, str, int]]) -> int:
+    """
+    Record (user_id, search word, hits) rows in `searches` and the search
+    aggregates, in one transaction. executemany sends each as multi-row
+    INSERTs.
+    """
+    searches, stats, variants = search_write_params(rows)
+    if not searches:
+        return 0
+    async with get_connection() as connection:
+        await connection.begin()
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.executemany(SEARCHES_INSERT, searches)
+                saved = cursor.rowcount
+                await cursor.executemany(SEARCH_WORD_STATS_UPSERT, stats)
+                await cursor.executemany(SEARCH_VARIANTS_UPSERT, variants)
+            await connection.commit()
+        except BaseException:
+            await connection.rollback()
+            raise
+    top_search_cache.invalidate(user_id for user_id, _ in searches)
+    return saved
+
+async def get_top_search_words(user_id: int, limit: int = 5) -> list[str]:
+    words = top_search_cache.get(user_id, limit)
+    if words is not None:
+        return words
+    query = f"""
+        SELECT s.search_key, {SEARCH_REPRESENTATIVE} AS search_word
+        FROM search_word_stats s
+        WHERE s.user_id = %s
+        ORDER BY {SEARCH_WORD_SCORE} DESC
+        LIMIT %s
+    """
+    rows = await _fetchall(query, (user_id, limit))
+    words = [row["search_word"] or row["search_key"] for row in rows]
+    top_search_cache.put(user_id, limit, words)
+    return words
+
+async def get_global_top_search_words(limit: int = 50) -> list[str]:
+    query = f"""
+        SELECT s.search_key, {SEARCH_REPRESENTATIVE} AS search_word
+        FROM (
+            SELECT search_key, SUM({SEARCH_WORD_SCORE}) AS score
+            FROM search_word_stats s
+            GROUP BY search_key
+            ORDER BY score DESC
+            LIMIT %s
+        ) s
+        ORDER BY s.score DESC
+    """
+    return [row["search_word"] or row["search_key"] for row in await _fetchall(query, (limit,))]
+
+# Auth
+
+async def _login_logic(email: str, password: str) -> dict:
+    error = _credentials_error(email, password)
+    if error:
+        return error
+
+    user = await get_user_by_email(email)
+
+    if user is None:
+        return {"success": False, "error": "Invalid email or password."}
+
+    if not await verify_password(password, user["hashed_password"]):
+        return {"success": False, "error": "Invalid email or password."}
+
+    # BCRYPT_ROUNDS changed since this hash was made — upgrade it now we know the password
+    if needs_rehash(user["hashed_password"]):
+        try:
+            await update_password_hash(user["user_id"], await hash_password(password))
+        except Exception as e:
+            print(f"[auth] Rehash for user {user['user_id']} failed: {e}")
+
+    return {
+        "success": True,
+        "message": "Login successful.",
+        "user_id": user["user_id"],
+        "email": user["email"],
+    }
+
+async def _register_logic(email: str, password: str) -> dict:
+    error = _credentials_error(email, password)
+    if error:
+        return error
+
+    user_id = await insert_user_if_new(email, await hash_password(password))
+
+    if user_id is None:
+        return {"success": False, "error": "Email already in use."}
+
+    return {
+        "success": True,
+        "message": "User registered successfully.",
+        "user_id": user_id,
+    }
@@ -1,8 +1,15 @@
+import os
 import re
+import hashlib
 import pymysql
-import bcrypt
+from datetime import datetime, timedelta
 from typing import Optional
 
+from .db_pool import get_db_pool
+from .password_hashing import hash_password_sync
+from .pricing import parse_price_pence
+from .query_canon import display_query, search_count_key
+
 
 def is_valid_email(email: str) -> bool:
     pattern = r"^[\w\.-]+@[\w\.-]+\.\w+$"
@@ -18,22 +25,15 @@ def is_strong_password(password: str) -> bool:
     return True
 
 def hash_password(plain_password: str) -> str:
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(plain_password.encode("utf-8"), salt)
-    return hashed.decode("utf-8")
+    return hash_password_sync(plain_password)
 
 def image_to_blob(image_path: str) -> bytes:
     with open(image_path, "rb") as f:
         return f.read()
 
 def get_db_connection():
-    return pymysql.connect(
-        host="127.0.0.1",
-        user="root",
-        password="",
-        database="dissertation_201652981",
-        cursorclass=pymysql.cursors.DictCursor,
-    )
+    """Borrow a pooled connection: `with get_db_connection() as connection:`."""
+    return get_db_pool().connection()
 
 # User Operations
 
@@ -161,74 +161,279 @@ def delete_avatar(avatar_id: int):
 
     return True
 
-def insert_search_match(user_id: int, search_words: list[str]) -> int:
-    query = """
-        INSERT IGNORE INTO searches (user_id, search_word)
-        VALUES (%s, %s)
+def get_search_word_counts() -> dict[str, int]:
+    """Return {search word as typed: number of times saved} across all users."""
+    query = "SELECT search_word, hits FROM search_variants"
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query)
+            rows = cursor.fetchall()
+
+    return {row["search_word"]: int(row["hits"]) for row in rows}
+
+# Search Word Stats
+#
+# `searches` logs the words as typed (see display_query). Two aggregates
+# are kept up to date on every write:
+#
+#   search_word_stats  per user and search_count_key (the canonical key with
+#                      its words sorted): hits and a decayed score,
+#                      so top-searches reads one primary-key range instead of
+#                      grouping the whole history
+#   search_variants    per count key and phrasing: hits, so a key can be
+#                      shown and crawled as its most common phrasing
+#                      ("fish and chips", not the key "chip fish")
+#
+# `score` is an exponentially decayed hit count: each write first decays
+# the stored score by the time since last_seen, then adds the new hits,
+# and readers apply the remaining decay up to NOW(). A search's weight
+# halves every SEARCH_STATS_HALF_LIFE_DAYS without new hits.
+
+SEARCH_STATS_HALF_LIFE_DAYS = float(os.environ.get("SEARCH_STATS_HALF_LIFE_DAYS", "30"))
+_HALF_LIFE_SECONDS = max(1.0, SEARCH_STATS_HALF_LIFE_DAYS * 86400)
+
+SEARCH_WORD_STATS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS search_word_stats (
+        user_id INT NOT NULL,
+        search_key VARCHAR(255) NOT NULL,
+        hits INT NOT NULL,
+        score DOUBLE NOT NULL,
+        last_seen DATETIME NOT NULL,
+        PRIMARY KEY (user_id, search_key),
+        INDEX idx_stats_key (search_key)
+    )
+"""
+
+SEARCH_VARIANTS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS search_variants (
+        search_key VARCHAR(255) NOT NULL,
+        search_word VARCHAR(255) NOT NULL,
+        hits INT NOT NULL,
+        PRIMARY KEY (search_key, search_word)
+    )
+"""
+
+SEARCHES_INSERT = """
+    INSERT IGNORE INTO searches (user_id, search_word)
+    VALUES (%s, %s)
+"""
+
+# Params: (user_id, search_key, hits, hits). MySQL applies the assignments
+# left to right, so score is decayed against the old last_seen.
+SEARCH_WORD_STATS_UPSERT = f"""
+    INSERT INTO search_word_stats (user_id, search_key, hits, score, last_seen)
+    VALUES (%s, %s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE
+        hits = hits + VALUES(hits),
+        score = score * POW(0.5, TIMESTAMPDIFF(SECOND, last_seen, NOW()) / {_HALF_LIFE_SECONDS}) + VALUES(score),
+        last_seen = NOW()
+"""
+
+# Params: (search_key, search_word, hits)
+SEARCH_VARIANTS_UPSERT = """
+    INSERT INTO search_variants (search_key, search_word, hits)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE hits = hits + VALUES(hits)
+"""
+
+# Decayed score of a search_word_stats row aliased `s`, as of now
+SEARCH_WORD_SCORE = f"s.score * POW(0.5, TIMESTAMPDIFF(SECOND, s.last_seen, NOW()) / {_HALF_LIFE_SECONDS})"
+
+# Most common phrasing of the search_key of a row aliased `s`
+SEARCH_REPRESENTATIVE = """(
+    SELECT v.search_word FROM search_variants v
+    WHERE v.search_key = s.search_key
+    ORDER BY v.hits DESC, v.search_word
+    LIMIT 1
+)"""
+
+def search_write_params(rows: list[tuple[int, str, int]]) -> tuple[list, list, list]:
+    """executemany params for `searches`, search_word_stats and search_variants."""
+    searches, stats, variants = [], [], []
+    for user_id, word, hits in rows:
+        key = search_count_key(word)
+        if not key:
+            continue
+        word = word[:255]
+        searches.append((user_id, word))
+        stats.append((user_id, key[:255], hits, hits))
+        variants.append((key[:255], word, hits))
+    return searches, stats, variants
+
+def create_search_stats_table():
+    """Create the search aggregates, backfilling them from `searches` the first time."""
+    backfill = """
+        SELECT user_id, search_word, COUNT(*) AS hits
+        FROM searches
+        GROUP BY user_id, search_word
     """
-    rows = [(user_id, word.lower().strip()) for word in search_words]
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(SEARCH_WORD_STATS_TABLE_DDL)
+            cursor.execute(SEARCH_VARIANTS_TABLE_DDL)
+            cursor.execute("SELECT 1 FROM search_word_stats LIMIT 1")
+            if cursor.fetchone() is None:
+                # Canonical keys are computed here, so the grouping can't stay in SQL
+                cursor.execute(backfill)
+                rows = [
+                    (row["user_id"], display_query(row["search_word"]), row["hits"])
+                    for row in cursor.fetchall()
+                ]
+                _, stats, variants = search_write_params(rows)
+                cursor.executemany(SEARCH_WORD_STATS_UPSERT, stats)
+                cursor.executemany(SEARCH_VARIANTS_UPSERT, variants)
+                print(f"[startup] Backfilled search stats from {len(stats)} search row(s).")
+        connection.commit()
 
+# Price Store
+
+PRODUCTS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS products (
+        product_key CHAR(40) NOT NULL PRIMARY KEY,
+        store VARCHAR(32) NOT NULL,
+        name VARCHAR(255) NOT NULL,
+        href VARCHAR(1024) NOT NULL DEFAULT '',
+        first_seen DATETIME NOT NULL,
+        last_seen DATETIME NOT NULL,
+        INDEX idx_products_store (store)
+    )
+"""
+
+PRICE_OBSERVATIONS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS price_observations (
+        observation_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        product_key CHAR(40) NOT NULL,
+        store VARCHAR(32) NOT NULL,
+        query_key VARCHAR(255) NOT NULL,
+        position SMALLINT NOT NULL,
+        price_text VARCHAR(64) NOT NULL,
+        price_pence INT NULL,
+        crawled_at DATETIME(6) NOT NULL,
+        INDEX idx_obs_query_store (query_key, store, crawled_at),
+        INDEX idx_obs_product (product_key, crawled_at)
+    )
+"""
+
+def create_price_tables():
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(PRODUCTS_TABLE_DDL)
+            cursor.execute(PRICE_OBSERVATIONS_TABLE_DDL)
+        connection.commit()
+
+def product_key(store: str, name: str, href: str) -> str:
+    return hashlib.sha1(f"{store}|{href or name}".encode("utf-8")).hexdigest()
+
+def insert_price_observations(store: str, query_key: str, results: list[list[str]]) -> int:
+    """
+    Persist one crawl of `store` for `query_key`.
+
+    `results` are the crawler's [name, price, href] rows, in page order.
+    Products are upserted, then every row gets a price observation stamped
+    with the same crawled_at so the crawl can be read back as a unit.
+    """
+    if not results:
+        return 0
+
+    crawled_at = datetime.now()
+    product_rows = []
+    observation_rows = []
+    for position, (name, price, href) in enumerate(results):
+        name = (name or "")[:255]
+        href = (href or "")[:1024]
+        key = product_key(store, name, href)
+        product_rows.append((key, store, name, href, crawled_at, crawled_at))
+        observation_rows.append(
+            (key, store, query_key[:255], position, (price or "")[:64], parse_price_pence(price), crawled_at)
+        )
+
+    product_query = """
+        INSERT INTO products (product_key, store, name, href, first_seen, last_seen)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE name = VALUES(name), href = VALUES(href), last_seen = VALUES(last_seen)
+    """
+    observation_query = """
+        INSERT INTO price_observations
+            (product_key, store, query_key, position, price_text, price_pence, crawled_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
     with get_db_connection() as connection:
         with connection.cursor() as cursor:
-            cursor.executemany(query, rows)
+            cursor.executemany(product_query, product_rows)
+            cursor.executemany(observation_query, observation_rows)
         connection.commit()
-        saved = cursor.rowcount
 
-    return saved
+    return len(observation_rows)
 
-def get_top_search_words(user_id: int, limit: int = 5) -> list[str]:
+def iter_catalogue_products(batch_size: int = 5000):
+    """Yield every row of the products table, streamed from the server in batches."""
+    query = "SELECT product_key, store, name, href FROM products"
+    with get_db_connection() as connection:
+        with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(query)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+def get_fresh_price_observations(query_key: str, store: str, max_age_seconds: float) -> Optional[list[list[str]]]:
     """
-    Return the user's most frequently matched search words,
-    ordered by how many times they've appeared across past basket trips.
+    Return the latest crawl of `store` for `query_key` as [name, price, href]
+    rows, or None if there is none newer than `max_age_seconds`.
     """
+    cutoff = datetime.now() - timedelta(seconds=max_age_seconds)
     query = """
-        SELECT search_word, COUNT(*) AS frequency
-        FROM searches
-        WHERE user_id = %s
-        GROUP BY search_word
-        ORDER BY frequency DESC
-        LIMIT %s
+        SELECT p.name, o.price_text, p.href
+        FROM price_observations o
+        JOIN products p ON p.product_key = o.product_key
+        WHERE o.query_key = %s AND o.store = %s
+          AND o.crawled_at = (
+              SELECT MAX(crawled_at) FROM price_observations
+              WHERE query_key = %s AND store = %s AND crawled_at >= %s
+          )
+        ORDER BY o.position
     """
     with get_db_connection() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(query, (user_id, limit))
+            cursor.execute(query, (query_key, store, query_key, store, cutoff))
             rows = cursor.fetchall()
- 
-    return [row["search_word"] for row in rows]
 
-def _login_logic(email: str, password: str) -> dict:
-    if not is_valid_email(email):
-        return {"success": False, "error": "Invalid email format."}
-
-    if not is_strong_password(password):
-        return {
-            "success": False,
-            "error": "Password must be at least 6 characters long, contain a number and an uppercase letter.",
-        }
+    if not rows:
+        return None
+    return [[row["name"], row["price_text"], row["href"]] for row in rows]
 
+def get_user_by_email(email: str) -> Optional[dict]:
     query = "SELECT * FROM users WHERE email = %s"
     with get_db_connection() as connection:
         with connection.cursor() as cursor:
             cursor.execute(query, (email,))
-            user = cursor.fetchone()
-
-    if user is None:
-        return {"success": False, "error": "Invalid email or password."}
+            return cursor.fetchone()
 
-    if not bcrypt.checkpw(
-        password.encode("utf-8"),
-        user["hashed_password"].encode("utf-8"),
-    ):
-        return {"success": False, "error": "Invalid email or password."}
+def update_password_hash(user_id: int, hashed_password: str) -> None:
+    query = "UPDATE users SET hashed_password = %s WHERE user_id = %s"
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, (hashed_password, user_id))
+        connection.commit()
 
-    return {
-        "success": True,
-        "message": "Login successful.",
-        "user_id": user["user_id"],
-        "email": user["email"],
-    }
+def insert_user_if_new(email: str, hashed_password: str) -> Optional[int]:
+    """Insert the user on a single connection; None if the email is taken."""
+    query = "SELECT user_id FROM users WHERE email = %s"
+    insert = """
+        INSERT INTO users (email, hashed_password)
+        VALUES (%s, %s)
+    """
+    with get_db_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(query, (email,))
+            if cursor.fetchone() is not None:
+                return None
+            cursor.execute(insert, (email, hashed_password))
+        connection.commit()
+        return cursor.lastrowid
 
-def _register_logic(email: str, password: str) -> dict:
+def _credentials_error(email: str, password: str) -> Optional[dict]:
     if not is_valid_email(email):
         return {"success": False, "error": "Invalid email format."}
 
@@ -237,21 +442,4 @@ def _register_logic(email: str, password: str) -> dict:
             "success": False,
             "error": "Password must be at least 6 characters long, contain a number and an uppercase letter.",
         }
-
-    query = "SELECT * FROM users WHERE email = %s"
-
-    with get_db_connection() as connection:
-        with connection.cursor() as cursor:
-            cursor.execute(query, (email,))
-            existing_user = cursor.fetchone()
-
-    if existing_user is not None:
-        return {"success": False, "error": "Email already in use."}
-
-    user_id = insert_user(email, password)
-
-    return {
-        "success": True,
-        "message": "User registered successfully.",
-        "user_id": user_id,
-    }
+    return None
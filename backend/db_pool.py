@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+# Pooled MySQL connections for database_ops.
+#
+# Opening a connection costs a TCP handshake and an auth round trip, which
+# dominated the cost of the single-statement queries in database_ops. The
+# pool keeps up to DB_POOL_SIZE connections open; callers beyond that wait.
+# Idle connections are pinged before reuse once they've sat for
+# DB_POOL_PING_AFTER seconds, and replaced after DB_POOL_RECYCLE seconds so
+# the server's wait_timeout never closes one underneath us.
+
+DB_HOST = os.environ.get("DB_HOST", "127.0.0.1")
+DB_PORT = int(os.environ.get("DB_PORT", "3306"))
+DB_USER = os.environ.get("DB_USER", "root")
+DB_PASSWORD = os.environ.get("DB_PASSWORD", "")
+DB_NAME = os.environ.get("DB_NAME", "dissertation_201652981")
+
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", "30"))
+
+
+def _new_connection():
+    return pymysql.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        cursorclass=pymysql.cursors.DictCursor,
+    )
+
+
+def _close_connection(connection) -> None:
+    try:
+        connection.close()
+    except Exception:
+        pass  # already gone
+
+
+class _PooledConnection:
+    __slots__ = ("connection", "created", "last_used")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of pymysql connections.
+
+    Connections are validated on checkout, recycled by age, and rolled back
+    on checkin if left mid-transaction, so a read never sees another
+    caller's stale snapshot.
+    """
+
+    def __init__(self, size: int = DB_POOL_SIZE, recycle: float = DB_POOL_RECYCLE,
+                 ping_after: float = DB_POOL_PING_AFTER, factory=None):
+        self.size = max(1, size)
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._factory = factory or _new_connection
+        self._idle: list[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+        self.opened = 0
+
+    def _open(self) -> _PooledConnection:
+        entry = _PooledConnection(self._factory())
+        with self._lock:
+            self.opened += 1
+        return entry
+
+    def _is_usable(self, entry: _PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - entry.created > self.recycle:
+            return False
+        if now - entry.last_used > self.ping_after:
+            try:
+                entry.connection.ping(reconnect=False)
+            except Exception as e:
+                print(f"[DBPool] Idle connection failed ping ({e}) — replacing.")
+                return False
+        return True
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return self._open()
+            if self._is_usable(entry):
+                return entry
+            _close_connection(entry.connection)
+
+    def _checkin(self, entry: _PooledConnection, broken: bool) -> None:
+        connection = entry.connection
+        discard = not connection.open
+        if not discard and (broken or connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS):
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        entry.last_used = time.monotonic()
+        with self._lock:
+            if not (self._closed or discard):
+                self._idle.append(entry)
+                return
+        _close_connection(connection)
+
+    @contextmanager
+    def connection(self, timeout: float = DB_POOL_TIMEOUT):
+        if self._closed:
+            raise RuntimeError("Database pool is shut down")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No database connection free after {timeout:.0f}s")
+        entry = None
+        broken = False
+        try:
+            entry = self._checkout()
+            yield entry.connection
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            if entry is not None:
+                self._checkin(entry, broken)
+            self._slots.release()
+
+    def warm(self, count: int = 1) -> None:
+        """Open `count` idle connections up front."""
+        for _ in range(min(count, self.size)):
+            try:
+                entry = self._open()
+            except Exception as e:
+                print(f"[DBPool] Warm-up connect failed: {e}")
+                return
+            with self._lock:
+                self._idle.append(entry)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            _close_connection(entry.connection)
+        print(f"[DBPool] Closed ({len(idle)} idle connections, {self.opened} opened in total).")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "idle": len(self._idle), "opened": self.opened}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_closed = False  # set by close_db_pool so late callers can't reopen it
+
+
+def get_db_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if _pool_closed:
+                raise RuntimeError("Database pool is shut down")
+            _pool = ConnectionPool()
+        return _pool
+
+
+def init_db_pool() -> None:
+    global _pool_closed
+    with _pool_lock:
+        _pool_closed = False
+    get_db_pool().warm()
+
+
+def close_db_pool() -> None:
+    global _pool, _pool_closed
+    with _pool_lock:
+        _pool_closed = True
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
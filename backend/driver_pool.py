@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.options import Options
+
+# Warm, reusable headless Chrome sessions for the store crawlers.
+#
+# Each store gets its own pool so a slow Morrisons page never holds a
+# Sainsbury's browser hostage. A pool never runs more than DRIVER_POOL_SIZE
+# Chrome processes; callers beyond that wait for a session to come back.
+
+DRIVER_POOL_SIZE = int(os.environ.get("DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_USES = int(os.environ.get("DRIVER_MAX_USES", "25"))
+DRIVER_ACQUIRE_TIMEOUT = float(os.environ.get("DRIVER_ACQUIRE_TIMEOUT", "120"))
+DRIVER_WARM_ON_START = os.environ.get("DRIVER_WARM_ON_START", "1") != "0"
+
+STORES = ("sainsburys", "homebargains", "morrisons")
+
+_SAINSBURYS_USER_AGENT = (
+    "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.5993.70 Safari/537.36"
+)
+
+_SAINSBURYS_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.webp", "*.gif", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics.com/*", "*googletagmanager.com/*",
+    "*doubleclick.net/*", "*facebook.net/*", "*hotjar.com/*",
+]
+
+
+def _chrome_options(store: str) -> Options:
+    options = Options()
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    if store == "sainsburys":
+        options.add_argument(_SAINSBURYS_USER_AGENT)
+    options.add_argument("--headless=new")
+    options.add_argument("--window-size=1920,1080")
+    return options
+
+
+def _new_driver(store: str):
+    t0 = time.time()
+    driver = webdriver.Chrome(options=_chrome_options(store))
+
+    # Blocked URLs are per browser session, so set them once at launch
+    if store == "sainsburys":
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": _SAINSBURYS_BLOCKED_URLS})
+
+    print(f"[DriverPool] {store}: launched Chrome in {time.time()-t0:.1f}s")
+    return driver
+
+
+def _quit_driver(store: str, driver) -> None:
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"[DriverPool] {store}: quit failed: {e}")
+
+
+class _PooledDriver:
+    __slots__ = ("driver", "uses")
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class DriverPool:
+    """
+    Fixed-size pool of Chrome sessions for a single store.
+
+    Sessions are health-checked on checkout and recycled after
+    `max_uses` crawls, or straight away if a crawl raised.
+    """
+
+    def __init__(self, store: str, size: int = DRIVER_POOL_SIZE,
+                 max_uses: int = DRIVER_MAX_USES, factory=None):
+        self.store = store
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self._factory = factory or (lambda: _new_driver(store))
+        self._idle: list[_PooledDriver] = []
+        self._live = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def warm(self, count: int = None) -> None:
+        """Launch idle sessions up front so the first searches skip the cold start."""
+        target = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= target or self._live >= self.size:
+                    return
+                self._live += 1
+            try:
+                entry = self._launch()
+            except Exception as e:
+                print(f"[DriverPool] {self.store}: warm-up launch failed: {e}")
+                return
+            with self._lock:
+                if not self._closed:
+                    self._idle.append(entry)
+                    continue
+            self._retire(entry)
+            return
+
+    def _launch(self) -> _PooledDriver:
+        # Caller has already counted this session in _live
+        try:
+            return _PooledDriver(self._factory())
+        except BaseException:
+            with self._lock:
+                self._live -= 1
+            raise
+
+    def _retire(self, entry: _PooledDriver) -> None:
+        _quit_driver(self.store, entry.driver)
+        with self._lock:
+            self._live -= 1
+
+    def _is_healthy(self, entry: _PooledDriver) -> bool:
+        try:
+            entry.driver.execute_script("return 1")
+            return True
+        except Exception as e:
+            print(f"[DriverPool] {self.store}: health check failed ({e}) — recycling.")
+            return False
+
+    def _checkout(self) -> _PooledDriver:
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    self._live += 1
+            if entry is None:
+                return self._launch()
+            if self._is_healthy(entry):
+                return entry
+            self._retire(entry)
+
+    def _checkin(self, entry: _PooledDriver, broken: bool) -> None:
+        entry.uses += 1
+        with self._lock:
+            if not (broken or self._closed or entry.uses >= self.max_uses):
+                self._idle.append(entry)
+                return
+        reason = "crashed" if broken else "closed" if self._closed else f"{entry.uses} uses"
+        print(f"[DriverPool] {self.store}: retiring session ({reason}).")
+        self._retire(entry)
+
+    @contextmanager
+    def session(self, timeout: float = DRIVER_ACQUIRE_TIMEOUT):
+        if self._closed:
+            raise RuntimeError(f"Driver pool for {self.store} is shut down")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No {self.store} browser free after {timeout:.0f}s")
+        entry = None
+        broken = False
+        try:
+            entry = self._checkout()
+            yield entry.driver
+        except TimeoutException:
+            # A slow page is not a sick browser — keep the session
+            raise
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            if entry is not None:
+                self._checkin(entry, broken)
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._retire(entry)
+        print(f"[DriverPool] {self.store}: shut down ({len(idle)} idle sessions closed).")
+
+
+_pools: dict[str, DriverPool] = {}
+_pools_lock = threading.Lock()
+_pools_closed = False  # set by shutdown_pools so late crawl threads can't start Chrome again
+
+
+def get_pool(store: str) -> DriverPool:
+    with _pools_lock:
+        pool = _pools.get(store)
+        if pool is None:
+            if _pools_closed:
+                raise RuntimeError(f"Driver pools are shut down; no {store} browser")
+            pool = _pools[store] = DriverPool(store)
+        return pool
+
+
+def driver_session(store: str):
+    """Borrow a warm Chrome session for `store`: `with driver_session("morrisons") as driver:`"""
+    return get_pool(store).session()
+
+
+def start_pools() -> None:
+    """Create the per-store pools and warm them in the background."""
+    global _pools_closed
+    with _pools_lock:
+        _pools_closed = False
+    pools = [get_pool(store) for store in STORES]
+    if not DRIVER_WARM_ON_START:
+        return
+    for pool in pools:
+        threading.Thread(target=pool.warm, name=f"warm-{pool.store}", daemon=True).start()
+
+
+def shutdown_pools() -> None:
+    global _pools_closed
+    with _pools_lock:
+        _pools_closed = True
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown()
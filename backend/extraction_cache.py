@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+# Persistent cache for the LLM fallback, kept in a local SQLite file.
+#
+#  - llm_extractions: products the LLM extracted, content-addressed by a
+#    hash of the cleaned payload it was given.
+#  - learned_selectors: CSS selector specs derived from a successful LLM
+#    extraction, so later pages with the same layout skip the LLM entirely.
+
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH", str(Path(__file__).with_name("llm_cache.sqlite3"))
+)
+LEARNED_SELECTORS_PER_SITE = 5
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_extractions (
+        payload_hash TEXT PRIMARY KEY,
+        site TEXT NOT NULL,
+        model TEXT NOT NULL,
+        results TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS learned_selectors (
+        site TEXT NOT NULL,
+        spec_hash TEXT NOT NULL,
+        spec TEXT NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (site, spec_hash)
+    );
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    connection = sqlite3.connect(LLM_CACHE_PATH, timeout=10)
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                connection.executescript(_SCHEMA)
+                _schema_ready = True
+    return connection
+
+
+def payload_hash(site: str, payload: str) -> str:
+    return hashlib.sha256(f"{site}\n{payload}".encode("utf-8")).hexdigest()
+
+
+def get_cached_extraction(key: str) -> Optional[list[list[str]]]:
+    with closing(_connect()) as connection:
+        row = connection.execute(
+            "SELECT results FROM llm_extractions WHERE payload_hash = ?", (key,)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def store_extraction(key: str, site: str, model: str, results: list[list[str]]) -> None:
+    with closing(_connect()) as connection, connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO llm_extractions (payload_hash, site, model, results, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, site, model, json.dumps(results, ensure_ascii=False), time.time()),
+        )
+
+
+def get_learned_selectors(site: str) -> list[dict]:
+    """Learned specs for `site`, most recently useful first."""
+    with closing(_connect()) as connection:
+        rows = connection.execute(
+            "SELECT spec FROM learned_selectors WHERE site = ? ORDER BY last_used DESC LIMIT ?",
+            (site, LEARNED_SELECTORS_PER_SITE),
+        ).fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+
+def store_learned_selectors(site: str, spec: dict) -> None:
+    encoded = json.dumps(spec, sort_keys=True)
+    spec_hash = hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+    now = time.time()
+    with closing(_connect()) as connection, connection:
+        connection.execute(
+            "INSERT INTO learned_selectors (site, spec_hash, spec, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (site, spec_hash) DO UPDATE SET last_used = excluded.last_used",
+            (site, spec_hash, encoded, now, now),
+        )
+
+
+def mark_learned_selectors_used(site: str, spec: dict) -> None:
+    spec_hash = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+    with closing(_connect()) as connection, connection:
+        connection.execute(
+            "UPDATE learned_selectors SET hits = hits + 1, last_used = ? WHERE site = ? AND spec_hash = ?",
+            (time.time(), site, spec_hash),
+        )
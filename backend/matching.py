@@ -0,0 +1,257 @@
+import re
+import threading
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from .database_ops import iter_catalogue_products, product_key
+from .pricing import parse_pack_size, parse_price_pence
+
+# Cross-store product matching.
+#
+# Product names are reduced to a token set (lowercased words, with the
+# pack size folded into one canonical token so "2 Pints" and "1.14L"
+# agree). Token sets are MinHashed and banded into an LSH table, so finding
+# similar names only looks at the few products sharing a band bucket rather
+# than the whole catalogue; candidates are then confirmed with exact
+# Jaccard similarity on the token sets.
+
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16  # 4 rows per band: pairs around 0.5 Jaccard usually collide
+MATCH_THRESHOLD = 0.5
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(0x5EED)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.int64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=MINHASH_PERMUTATIONS, dtype=np.int64)
+_BAND_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+_BAND_MIX = _rng.integers(1, _MERSENNE_PRIME, size=_BAND_ROWS, dtype=np.uint64)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SIZE_TOKEN_RE = re.compile(
+    r"\b\d+\s*[x×]\s*\d+(?:\.\d+)?\s*(?:kg|g|ml|cl|l|litres?|ltr)\b"
+    r"|\b\d+(?:\.\d+)?\s*(?:kg|g|ml|cl|l|litres?|ltr|pints?|pt|pack|pk)\b",
+    re.IGNORECASE,
+)
+_STOP_WORDS = frozenset({"the", "and", "with", "of", "in", "for", "a", "x", "pack", "each"})
+
+
+def tokenize(name: str) -> frozenset[str]:
+    """Normalised token set for a product name, pack size as one "size:" token."""
+    if not name:
+        return frozenset()
+    tokens = set()
+    pack = parse_pack_size(name)
+    if pack is not None:
+        amount, unit = pack
+        # Round so 4 pints (2273ml) and 2.27L land on the same token
+        tokens.add(f"size:{round(amount, -1) if amount >= 100 else round(amount)}{unit}")
+        name = _SIZE_TOKEN_RE.sub(" ", name)
+    for word in _WORD_RE.findall(name.lower()):
+        if word in _STOP_WORDS or word.isdigit():
+            continue
+        tokens.add(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return frozenset(tokens)
+
+
+def minhash(tokens: frozenset[str]) -> np.ndarray:
+    if not tokens:
+        return np.full(MINHASH_PERMUTATIONS, _MERSENNE_PRIME, dtype=np.int64)
+    hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.int64, count=len(tokens))
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME).min(axis=1)
+
+
+def minhash_many(token_sets: list[frozenset[str]]) -> np.ndarray:
+    """minhash() for many non-empty token sets at once, as an (n, permutations) array."""
+    lengths = np.fromiter((len(t) for t in token_sets), dtype=np.int64, count=len(token_sets))
+    hashes = np.fromiter(
+        (zlib.crc32(t.encode("utf-8")) for tokens in token_sets for t in tokens),
+        dtype=np.int64, count=int(lengths.sum()),
+    )
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.minimum.reduceat(permuted, starts, axis=1).T
+
+
+def band_keys(signatures: np.ndarray) -> list[list[int]]:
+    """One LSH bucket key per band for each (n, permutations) signature row."""
+    bands = signatures.astype(np.uint64).reshape(len(signatures), LSH_BANDS, _BAND_ROWS)
+    mixed = (bands * _BAND_MIX).sum(axis=2)  # wraps mod 2**64, fine for a hash
+    # Low bits carry the band number so equal values in different bands don't collide
+    return ((mixed << np.uint64(4)) | np.arange(LSH_BANDS, dtype=np.uint64)).tolist()
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ProductIndex:
+    """LSH index over product names. Thread-safe; add() is idempotent per item id."""
+
+    def __init__(self):
+        self._buckets: dict[int, set] = {}
+        self._items: dict[object, tuple[str, str, str, frozenset]] = {}  # id -> (store, name, href, tokens)
+        self._lock = threading.Lock()
+
+    def add(self, item_id, store: str, name: str, href: str = "") -> None:
+        if item_id in self._items:
+            return
+        tokens = tokenize(name)
+        if not tokens:
+            return
+        keys = band_keys(minhash(tokens)[None, :])[0]
+        with self._lock:
+            if item_id in self._items:
+                return
+            self._items[item_id] = (store, name, href, tokens)
+            for key in keys:
+                self._buckets.setdefault(key, set()).add(item_id)
+
+    def add_many(self, items: list[tuple]) -> None:
+        """add() for a batch of (item_id, store, name, href), MinHashed in one NumPy pass."""
+        fresh = []
+        for item_id, store, name, href in items:
+            if item_id not in self._items:
+                tokens = tokenize(name)
+                if tokens:
+                    fresh.append((item_id, store, name, href, tokens))
+        if not fresh:
+            return
+        keys = band_keys(minhash_many([entry[4] for entry in fresh]))
+        with self._lock:
+            for (item_id, store, name, href, tokens), item_keys in zip(fresh, keys):
+                if item_id in self._items:
+                    continue
+                self._items[item_id] = (store, name, href, tokens)
+                for key in item_keys:
+                    self._buckets.setdefault(key, set()).add(item_id)
+
+    def candidates(self, tokens: frozenset) -> set:
+        found = set()
+        with self._lock:
+            for key in band_keys(minhash(tokens)[None, :])[0]:
+                found |= self._buckets.get(key, set())
+        return found
+
+    def similar(self, name: str, threshold: float = MATCH_THRESHOLD, limit: int = 20,
+                exclude_store: Optional[str] = None) -> list[dict]:
+        """Products whose names are at least `threshold` Jaccard-similar to `name`, best first."""
+        tokens = tokenize(name)
+        if not tokens:
+            return []
+        scored = []
+        for item_id in self.candidates(tokens):
+            store, item_name, href, item_tokens = self._items[item_id]
+            if store == exclude_store:
+                continue
+            score = jaccard(tokens, item_tokens)
+            if score >= threshold:
+                scored.append((score, item_id, store, item_name, href))
+        scored.sort(key=lambda s: -s[0])
+        return [
+            {"store": store, "name": item_name, "href": href, "score": round(score, 3)}
+            for score, _, store, item_name, href in scored[:limit]
+        ]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def match_groups(results: dict[str, list[list[str]]], threshold: float = MATCH_THRESHOLD) -> list[dict]:
+    """
+    Group equivalent products across stores in one search's results.
+
+    Each group holds at most one product per store and spans at least two
+    stores; items are listed cheapest first. Pairs are merged best match
+    first, so a product joins the group it resembles most.
+    """
+    index = ProductIndex()
+    rows = {}
+    for store, store_rows in results.items():
+        for i, row in enumerate(store_rows or []):
+            if row and row[0]:
+                rows[(store, i)] = row
+    index.add_many([(item_id, item_id[0], row[0], "") for item_id, row in rows.items()])
+
+    pairs = []
+    for item_id in rows:
+        if item_id not in index._items:
+            continue  # no usable tokens
+        tokens = index._items[item_id][3]
+        for other in index.candidates(tokens):
+            if other[0] == item_id[0] or other <= item_id:
+                continue
+            score = jaccard(tokens, index._items[other][3])
+            if score >= threshold:
+                pairs.append((score, item_id, other))
+    pairs.sort(key=lambda p: -p[0])
+
+    # Union-find that refuses merges putting two items from one store together
+    parent = {item_id: item_id for item_id in rows}
+    stores_of = {item_id: {item_id[0]} for item_id in rows}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for _, a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra == rb or stores_of[ra] & stores_of[rb]:
+            continue
+        parent[rb] = ra
+        stores_of[ra] |= stores_of.pop(rb)
+
+    members: dict[tuple, list] = {}
+    for item_id in rows:
+        members.setdefault(find(item_id), []).append(item_id)
+
+    groups = []
+    for group in members.values():
+        if len(group) < 2:
+            continue
+        items = []
+        for store, i in group:
+            name, price = rows[(store, i)][0], rows[(store, i)][1] if len(rows[(store, i)]) > 1 else ""
+            items.append({"store": store, "index": i, "name": name, "price_pence": parse_price_pence(price)})
+        items.sort(key=lambda item: (item["price_pence"] is None, item["price_pence"] or 0))
+        groups.append({"name": min((item["name"] for item in items), key=len), "items": items})
+    groups.sort(key=lambda g: (-len(g["items"]), g["name"]))
+    return groups
+
+
+# Every product the price store has seen, for lookups across past searches
+catalogue_index = ProductIndex()
+
+
+def add_to_catalogue(store: str, results: list[list[str]]) -> None:
+    items = []
+    for row in results:
+        if row and row[0]:
+            href = row[2] if len(row) > 2 else ""
+            items.append((product_key(store, row[0], href), store, row[0], href))
+    catalogue_index.add_many(items)
+
+
+def load_catalogue() -> None:
+    """Fill catalogue_index from the products table."""
+    batch = []
+    try:
+        for product in iter_catalogue_products():
+            batch.append((product["product_key"], product["store"], product["name"], product["href"]))
+            if len(batch) >= 5000:
+                catalogue_index.add_many(batch)
+                batch = []
+        catalogue_index.add_many(batch)
+    except Exception as e:
+        print(f"[Matching] Could not load the product catalogue: {e}")
+        return
+    print(f"[Matching] Catalogue index holds {len(catalogue_index)} products.")
+
+
+def start_catalogue_load() -> None:
+    threading.Thread(target=load_catalogue, name="catalogue-load", daemon=True).start()
@@ -0,0 +1,85 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# bcrypt hashing and verification, off the request threadpool.
+#
+# bcrypt is deliberately slow CPU work. Run inline in sync handlers, a login
+# burst would fill FastAPI's shared threadpool and stall searches behind it,
+# so hashing gets its own executor sized to the machine's cores (bcrypt
+# releases the GIL while it works). At most AUTH_HASH_MAX_PENDING hashes may
+# be running or queued; callers beyond that wait up to
+# AUTH_HASH_QUEUE_TIMEOUT seconds for a slot and are then turned away with
+# AuthBusyError, which the API maps to 503.
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+AUTH_HASH_WORKERS = int(os.environ.get("AUTH_HASH_WORKERS", str(os.cpu_count() or 2)))
+AUTH_HASH_MAX_PENDING = int(os.environ.get("AUTH_HASH_MAX_PENDING", str(AUTH_HASH_WORKERS * 4)))
+AUTH_HASH_QUEUE_TIMEOUT = float(os.environ.get("AUTH_HASH_QUEUE_TIMEOUT", "2"))
+
+
+class AuthBusyError(RuntimeError):
+    """Too many password hashes are already queued."""
+
+
+def hash_password_sync(plain_password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(plain_password.encode("utf-8"), salt).decode("utf-8")
+
+
+def hash_rounds(hashed_password: str) -> int:
+    """Cost factor of a "$2b$12$..." hash, or 0 if it can't be read."""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+def _check_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+_executor = None
+_admission = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(1, AUTH_HASH_WORKERS), thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _run(fn, *args):
+    global _admission
+    if _admission is None:
+        _admission = asyncio.Semaphore(max(1, AUTH_HASH_MAX_PENDING))
+    try:
+        await asyncio.wait_for(_admission.acquire(), AUTH_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise AuthBusyError("Authentication is busy, please retry shortly.") from None
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _admission.release()
+
+
+async def hash_password(plain_password: str) -> str:
+    return await _run(hash_password_sync, plain_password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(_check_password, plain_password, hashed_password)
+
+
+def shutdown_hash_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
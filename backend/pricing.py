@@ -0,0 +1,143 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+# "£1.20", "£ 3", "95p", "£3.99, £2.49" (double price — last one is the sale price)
+_POUNDS_RE = re.compile(r"£\s*(\d+(?:,\d{3})*)(?:\.(\d{1,2}))?")
+_PENCE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*p\b", re.IGNORECASE)
+
+
+def parse_price_pence(price: str) -> Optional[int]:
+    """
+    Parse a scraped price string into integer pence.
+
+    Takes the last price when several are listed, so "£3.99, £2.49"
+    gives 249. Returns None when no price can be found.
+    """
+    if not price:
+        return None
+
+    matches = list(_POUNDS_RE.finditer(price))
+    if matches:
+        pounds, pence = matches[-1].groups()
+        pence = (pence or "0").ljust(2, "0")
+        return int(pounds.replace(",", "")) * 100 + int(pence)
+
+    matches = list(_PENCE_RE.finditer(price))
+    if matches:
+        return round(float(matches[-1].group(1)))
+
+    return None
+
+
+# Pack sizes in product names: "2L", "6 x 330ml", "500g", "4 Pints", "12 Pack"
+_MULTIPACK_RE = re.compile(r"(\d+)\s*[x×]\s*(\d+(?:\.\d+)?)\s*(kg|g|ml|cl|l|litres?|ltr)\b", re.IGNORECASE)
+_SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|ml|cl|l|litres?|ltr|pints?|pt)\b", re.IGNORECASE)
+_COUNT_RE = re.compile(r"(\d+)\s*(?:pack|pk|x|per pack|rolls?|bags|eggs|pieces)\b", re.IGNORECASE)
+
+# Base unit and multiplier for each unit as written
+_UNITS = {
+    "g": ("g", 1.0), "kg": ("g", 1000.0),
+    "ml": ("ml", 1.0), "cl": ("ml", 10.0), "l": ("ml", 1000.0), "litre": ("ml", 1000.0),
+    "litres": ("ml", 1000.0), "ltr": ("ml", 1000.0),
+    "pint": ("ml", 568.261), "pints": ("ml", 568.261), "pt": ("ml", 568.261),
+}
+# Unit prices are quoted per 100g / 100ml / item
+_UNIT_BASIS = {"g": 100.0, "ml": 100.0, "each": 1.0}
+_UNIT_LABELS = {"g": "per 100g", "ml": "per 100ml", "each": "each"}
+
+
+@lru_cache(maxsize=8192)
+def parse_pack_size(name: str) -> Optional[tuple[float, str]]:
+    """
+    Parse the pack size out of a product name as (amount, unit), where
+    unit is "g", "ml" or "each". "6 x 330ml" gives (1980.0, "ml"), "2L"
+    gives (2000.0, "ml"), "12 Pack" gives (12.0, "each"). None if the
+    name carries no size.
+    """
+    if not name:
+        return None
+
+    match = _MULTIPACK_RE.search(name)
+    if match:
+        count, size, unit = match.groups()
+        base, factor = _UNITS[unit.lower()]
+        return int(count) * float(size) * factor, base
+
+    matches = list(_SIZE_RE.finditer(name))
+    if matches:
+        size, unit = matches[-1].groups()
+        base, factor = _UNITS[unit.lower()]
+        return float(size) * factor, base
+
+    match = _COUNT_RE.search(name)
+    if match and int(match.group(1)) > 0:
+        return float(match.group(1)), "each"
+
+    return None
+
+
+def compare_results(results: dict[str, list[list[str]]]) -> list[dict]:
+    """
+    Flatten per-store results into one list ranked cheapest per unit.
+
+    Prices and pack sizes are parsed per row, then unit prices and the
+    ranking are computed in a single NumPy pass. Rows in the most common
+    unit come first, then other units, then rows without a pack size
+    (by price). Rows without a parseable price are left out.
+    """
+    stores, indexes, names, pence, amounts, units = [], [], [], [], [], []
+    for store, rows in results.items():
+        for index, row in enumerate(rows or []):
+            name, price = row[0], row[1] if len(row) > 1 else ""
+            price_pence = parse_price_pence(price)
+            if price_pence is None:
+                continue
+            pack = parse_pack_size(name)
+            stores.append(store)
+            indexes.append(index)
+            names.append(name)
+            pence.append(price_pence)
+            amounts.append(pack[0] if pack else np.nan)
+            units.append(pack[1] if pack else "")
+
+    if not pence:
+        return []
+
+    pence_arr = np.asarray(pence, dtype=np.float64)
+    amount_arr = np.asarray(amounts, dtype=np.float64)
+    unit_arr = np.asarray(units)
+    basis = np.array([_UNIT_BASIS.get(unit, np.nan) for unit in units])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_unit = pence_arr / amount_arr * basis
+    has_unit = np.isfinite(per_unit) & (amount_arr > 0)
+
+    # Most common unit ranks first; rows without a unit price rank last
+    labels, counts = np.unique(unit_arr[has_unit], return_counts=True)
+    rank_of = {label: rank for rank, label in enumerate(labels[np.argsort(-counts, kind="stable")])}
+    unit_rank = np.array([rank_of.get(unit, len(rank_of)) for unit in units])
+    unit_rank[~has_unit] = len(rank_of)
+    sort_price = np.where(has_unit, per_unit, pence_arr)
+    order = np.lexsort((pence_arr, sort_price, unit_rank))
+
+    comparison = []
+    for i in order:
+        row = {
+            "store": stores[i],
+            "index": indexes[i],
+            "name": names[i],
+            "price_pence": int(pence[i]),
+            "unit": None,
+            "pack_amount": None,
+            "unit_price_pence": None,
+            "unit_label": None,
+        }
+        if has_unit[i]:
+            row["unit"] = units[i]
+            row["pack_amount"] = round(float(amount_arr[i]), 2)
+            row["unit_price_pence"] = round(float(per_unit[i]), 2)
+            row["unit_label"] = _UNIT_LABELS[units[i]]
+        comparison.append(row)
+    return comparison
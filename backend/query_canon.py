@@ -0,0 +1,119 @@
+import json
+import os
+import re
+
+# Canonical form of a search query, used as the crawl / cache / price-store
+# key so near-duplicate searches ("Milk ", "milks", "the milk") share one
+# entry:
+#
+#   lowercase -> punctuation to spaces -> synonyms -> drop stop words
+#   -> singularise
+#
+# Word order is kept: "milk chocolate" and "chocolate milk" are different
+# products, and a crawl for one is served to everyone sharing its key.
+# search_count_key() also sorts the tokens; it only aggregates search
+# counts, where "semi skimmed milk" and "milk semi skimmed" may add up.
+#
+# Keys are for matching only. Anything shown to users or sent to a store
+# uses a real phrasing of the query (see display_query).
+#
+# Extra synonyms can be supplied as a JSON object {"word": "canonical"}
+# in the file named by QUERY_SYNONYMS_PATH.
+
+QUERY_SYNONYMS_PATH = os.environ.get("QUERY_SYNONYMS_PATH")
+
+_PUNCT_RE = re.compile(r"[^a-z0-9]+")
+
+_STOP_WORDS = frozenset({"a", "an", "the", "of", "and", "for", "with", "some", "in", "to", "my"})
+
+# Applied before and after singularising, so both "yoghurts" and "yoghurt" map
+_SYNONYMS = {
+    "yoghurt": "yogurt",
+    "zucchini": "courgette",
+    "eggplant": "aubergine",
+    "cilantro": "coriander",
+    "semiskimmed": "semi skimmed",
+    "loo": "toilet",
+    "bog": "toilet",
+    "veg": "vegetable",
+    "choc": "chocolate",
+    "oj": "orange juice",
+}
+
+_IRREGULAR_PLURALS = {
+    "cookies": "cookie", "pies": "pie", "smoothies": "smoothie", "brownies": "brownie",
+    "veggies": "veggie", "ties": "tie", "leaves": "leaf", "loaves": "loaf", "halves": "half",
+    "knives": "knife", "mice": "mouse", "geese": "goose", "children": "child",
+}
+# "-oes" plurals that drop "es"; others ("shoes", "canoes") just drop "s"
+_OES_PLURALS = frozenset({"tomatoes", "potatoes", "mangoes", "avocadoes", "buffaloes"})
+_NOT_PLURAL = frozenset({
+    "swiss", "hummus", "houmous", "couscous", "asparagus", "citrus", "molasses", "bass",
+    "cress", "floss", "grass", "glass", "news", "series", "species", "gas", "plus", "lotus",
+})
+
+
+def _load_synonyms() -> dict:
+    synonyms = dict(_SYNONYMS)
+    if QUERY_SYNONYMS_PATH:
+        try:
+            with open(QUERY_SYNONYMS_PATH, encoding="utf-8") as f:
+                synonyms.update({k.lower(): v.lower() for k, v in json.load(f).items()})
+        except (OSError, ValueError) as e:
+            print(f"[query_canon] Could not read synonyms from {QUERY_SYNONYMS_PATH}: {e}")
+    return synonyms
+
+
+synonyms = _load_synonyms()
+
+
+def singularise(word: str) -> str:
+    if word in _IRREGULAR_PLURALS:
+        return _IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word in _NOT_PLURAL or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"  # berries -> berry
+    if word.endswith(("sses", "xes", "ches", "shes", "zzes")) or word in _OES_PLURALS:
+        return word[:-2]  # glasses, boxes, peaches, tomatoes
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def canonical_tokens(query: str) -> list[str]:
+    tokens = []
+    for word in _PUNCT_RE.sub(" ", query.lower()).split():
+        for token in synonyms.get(word, word).split():
+            token = singularise(token)
+            token = synonyms.get(token, token)
+            tokens.extend(token.split())
+
+    kept = [t for t in tokens if t not in _STOP_WORDS]
+    return kept or tokens
+
+
+def canonical_query(query: str) -> str:
+    """
+    Canonical key for `query`: "Semi-Skimmed Milks " and "the semi skimmed
+    milk" both give "semi skimmed milk". Empty for a query with no words.
+    """
+    return " ".join(canonical_tokens(query or ""))
+
+
+def search_count_key(query: str) -> str:
+    """
+    Order-insensitive key for aggregating search counts: "semi skimmed milk"
+    and "milk, semi skimmed" both give "milk semi skimmed". Never use it
+    to look up or crawl results.
+    """
+    return " ".join(sorted(canonical_tokens(query or "")))
+
+
+def display_query(query: str) -> str:
+    """
+    The query as typed, tidied for storing and showing: lowercase,
+    punctuation to spaces, whitespace collapsed. "Fish & Chips " gives
+    "fish chips"; word order, plurals and stop words are left alone.
+    """
+    return " ".join(_PUNCT_RE.sub(" ", (query or "").lower()).split())
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .crawlers import STORE_CRAWLERS
+from .database_ops import get_fresh_price_observations, insert_price_observations
+from .matching import add_to_catalogue
+from .typeahead import typeahead_index
+
+# Shared, in-process cache of crawled search results.
+#
+# Entries are keyed by (normalized query, store) so one slow or failed store
+# doesn't force the other two to be crawled again. Concurrent misses for the
+# same entry are coalesced by the crawl engine (see crawl_engine.py).
+
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "1800"))
+SEARCH_CACHE_EMPTY_TTL = float(os.environ.get("SEARCH_CACHE_EMPTY_TTL", "60"))
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# How old a crawl persisted in MySQL may be and still be served without re-crawling
+PRICE_STORE_MAX_AGE = float(os.environ.get("PRICE_STORE_MAX_AGE", "21600"))
+
+# Rough per-row / per-entry overhead on top of the string payload
+_ROW_OVERHEAD = 200
+_ENTRY_OVERHEAD = 500
+
+
+def _estimate_size(results: list) -> int:
+    return _ENTRY_OVERHEAD + sum(
+        _ROW_OVERHEAD + sum(len(str(cell)) for cell in row) for row in results
+    )
+
+
+class SearchCache:
+    """
+    Thread-safe TTL + LRU cache of per-store search results.
+
+    Memory is capped at `max_bytes` (estimated from the row strings);
+    the least recently used entries are evicted first.
+    """
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, empty_ttl: float = SEARCH_CACHE_EMPTY_TTL,
+                 max_bytes: int = SEARCH_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()  # key -> (expires_at, size, results)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str, store: str):
+        entry_key = (key, store)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                return None
+            expires_at, size, results = entry
+            if expires_at < time.monotonic():
+                del self._entries[entry_key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(entry_key)
+            return results
+
+    def put(self, key: str, store: str, results: list) -> None:
+        entry_key = (key, store)
+        ttl = self.ttl if results else self.empty_ttl
+        size = _estimate_size(results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(entry_key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[entry_key] = (time.monotonic() + ttl, size, results)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+result_cache = SearchCache()
+
+
+def load_store_results(query: str, key: str, store: str, on_product=None) -> list:
+    """
+    Serve `store`'s results for `key` from the price store if a fresh crawl
+    is persisted there, otherwise crawl and persist the new results.
+
+    on_product is passed to the crawler (see fallback_llm_search).
+    Database errors are logged and never fail the search.
+    """
+    try:
+        rows = get_fresh_price_observations(key, store, PRICE_STORE_MAX_AGE)
+    except Exception as e:
+        print(f"[search_cache] Price store read failed for {store}/{key!r}: {e}")
+        rows = None
+    if rows:
+        print(f"[search_cache] ✓ {store} served from price store for {key!r} — {len(rows)} products")
+        return rows
+
+    results = STORE_CRAWLERS[store](query, on_product)
+    add_to_catalogue(store, results)
+    typeahead_index.add_product_names(row[0] for row in results if row)
+
+    try:
+        saved = insert_price_observations(store, key, results)
+        print(f"[search_cache] Persisted {saved} {store} price observations for {key!r}")
+    except Exception as e:
+        print(f"[search_cache] Price store write failed for {store}/{key!r}: {e}")
+    return results
+
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+
+from .database_async import insert_search_rows
+from .query_canon import canonical_query, display_query
+
+# Write-behind buffer for /api/search-matches.
+#
+# Basket actions only count (user_id, search word) hits here; a background
+# task writes them out in one batch (see insert_search_rows) whenever
+# SEARCH_MATCH_FLUSH_ROWS rows are waiting or SEARCH_MATCH_FLUSH_INTERVAL
+# seconds have passed, and once more on shutdown. Rows from a failed flush
+# go back on the buffer for the next attempt. Past SEARCH_MATCH_MAX_ROWS
+# (e.g. while the database is down) the oldest rows are dropped.
+
+SEARCH_MATCH_FLUSH_ROWS = int(os.environ.get("SEARCH_MATCH_FLUSH_ROWS", "500"))
+SEARCH_MATCH_FLUSH_INTERVAL = float(os.environ.get("SEARCH_MATCH_FLUSH_INTERVAL", "5"))
+SEARCH_MATCH_MAX_ROWS = int(os.environ.get("SEARCH_MATCH_MAX_ROWS", "50000"))
+
+
+class SearchMatchBuffer:
+    def __init__(self, flush_rows: int = SEARCH_MATCH_FLUSH_ROWS,
+                 flush_interval: float = SEARCH_MATCH_FLUSH_INTERVAL,
+                 max_rows: int = SEARCH_MATCH_MAX_ROWS, writer=None):
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        self.max_rows = max(self.flush_rows, max_rows)
+        self._writer = writer or insert_search_rows
+        # (user_id, word as typed) -> hits since the last flush, oldest first
+        self._rows: dict[tuple[int, str], int] = {}
+        self._wake = None
+        self._task = None
+        self._stopping = False
+        self._flush_lock = None
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_flush = None
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="search-match-flush")
+        print(f"[SearchMatches] Write-behind started (every {self.flush_interval:g}s or {self.flush_rows} rows).")
+
+    async def stop(self) -> None:
+        # Let the flusher finish its current write rather than cancelling it
+        # mid-insert, then flush whatever is left
+        if self._task is not None:
+            self._stopping = True
+            self._wake.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._rows:
+            print(f"[SearchMatches] {len(self._rows)} row(s) could not be written on shutdown.")
+
+    def add(self, user_id: int, search_words: list[str]) -> int:
+        """Queue the user's search words; returns how many were queued."""
+        added = 0
+        for word in dict.fromkeys(map(display_query, search_words)):
+            if canonical_query(word):
+                self._rows[(user_id, word)] = self._rows.get((user_id, word), 0) + 1
+                added += 1
+        self._trim()
+        if len(self._rows) >= self.flush_rows and self._wake is not None:
+            self._wake.set()
+        return added
+
+    def _trim(self) -> None:
+        excess = len(self._rows) - self.max_rows
+        if excess > 0:
+            for row in list(self._rows)[:excess]:
+                del self._rows[row]
+            self.dropped += excess
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        if not self._rows:
+            return 0
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            pending, self._rows = self._rows, {}
+            rows = [(user_id, word, hits) for (user_id, word), hits in pending.items()]
+            try:
+                await self._writer(rows)
+            except Exception as e:
+                self.failures += 1
+                print(f"[SearchMatches] Flush of {len(rows)} row(s) failed: {e}")
+                self._requeue(pending)
+                return 0
+            except BaseException:
+                self._requeue(pending)  # cancelled mid-write
+                raise
+            self.flushed += len(rows)
+            self.flushes += 1
+            self.last_flush = time.time()
+            return len(rows)
+
+    def _requeue(self, pending: dict) -> None:
+        # Put them back ahead of anything queued meanwhile
+        for row, hits in self._rows.items():
+            pending[row] = pending.get(row, 0) + hits
+        self._rows = pending
+        self._trim()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._rows),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "last_flush": self.last_flush,
+        }
+
+
+search_match_buffer = SearchMatchBuffer()
@@ -0,0 +1,10 @@
+import pytest
+
+from backend import extraction_cache
+
+
+@pytest.fixture(autouse=True)
+def temp_llm_cache(tmp_path, monkeypatch):
+    """Give every test an empty LLM cache instead of the dev cache in backend/."""
+    monkeypatch.setattr(extraction_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setattr(extraction_cache, "_schema_ready", False)
@@ -0,0 +1,288 @@
+"""
+Async data layer against an SQLite stand-in for the aiomysql pool.
+
+    python -m pytest backend/tests
+
+Queries are translated to SQLite on the way in (placeholders, INSERT
+IGNORE, ON DUPLICATE KEY UPDATE, FOR UPDATE, NOW/POW/TIMESTAMPDIFF), so
+the SQL under test is the SQL the API sends to MySQL.
+"""
+import asyncio
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import database_async
+from backend.password_hashing import BCRYPT_ROUNDS, hash_password_sync, hash_rounds
+
+SCHEMA = """
+    CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        hashed_password TEXT NOT NULL,
+        updated_at TEXT
+    );
+    CREATE TABLE searches (
+        user_id INTEGER NOT NULL,
+        search_word TEXT NOT NULL,
+        UNIQUE (user_id, search_word)
+    );
+    CREATE TABLE search_word_stats (
+        user_id INTEGER NOT NULL,
+        search_key TEXT NOT NULL,
+        hits INTEGER NOT NULL,
+        score REAL NOT NULL,
+        last_seen TEXT NOT NULL,
+        PRIMARY KEY (user_id, search_key)
+    );
+    CREATE TABLE search_variants (
+        search_key TEXT NOT NULL,
+        search_word TEXT NOT NULL,
+        hits INTEGER NOT NULL,
+        PRIMARY KEY (search_key, search_word)
+    );
+"""
+
+_TRANSLATIONS = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bINSERT IGNORE\b"), "INSERT OR IGNORE"),
+    (re.compile(r"\s+FOR UPDATE\b"), ""),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"\bTIMESTAMPDIFF\(SECOND,"), "TIMESTAMPDIFF_SECOND("),
+]
+
+
+def to_sqlite(query: str) -> str:
+    for pattern, replacement in _TRANSLATIONS:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+class FakeCursor:
+    def __init__(self, db: "FakeDatabase"):
+        self._db = db
+        self._cursor = db.sqlite.cursor()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._cursor.close()
+
+    async def execute(self, query, args=()):
+        self._db.statements.append(query)
+        self._cursor.execute(to_sqlite(query), args)
+
+    async def executemany(self, query, args):
+        self._db.statements.append(query)
+        self._cursor.executemany(to_sqlite(query), args)
+
+    async def fetchone(self):
+        row = self._cursor.fetchone()
+        return dict(row) if row is not None else None
+
+    async def fetchall(self):
+        return [dict(row) for row in self._cursor.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class FakeConnection:
+    def __init__(self, db: "FakeDatabase"):
+        self._db = db
+
+    def cursor(self):
+        return FakeCursor(self._db)
+
+    async def begin(self):
+        self._db.sqlite.execute("BEGIN")
+
+    async def commit(self):
+        self._db.sqlite.execute("COMMIT")
+
+    async def rollback(self):
+        self._db.sqlite.execute("ROLLBACK")
+
+
+class FakeDatabase:
+    """One in-memory SQLite database in autocommit mode, like the aiomysql pool."""
+
+    def __init__(self):
+        self.sqlite = sqlite3.connect(":memory:", isolation_level=None)
+        self.sqlite.row_factory = sqlite3.Row
+        self.sqlite.executescript(SCHEMA)
+        self.now = datetime(2026, 1, 1)
+        self.statements: list[str] = []
+
+        def timestamp_diff(start, end):
+            return int((datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds())
+
+        self.sqlite.create_function("NOW", 0, lambda: self.now.isoformat(sep=" "))
+        self.sqlite.create_function("POW", 2, lambda base, exp: base ** exp)
+        self.sqlite.create_function("TIMESTAMPDIFF_SECOND", 2, timestamp_diff)
+
+    @asynccontextmanager
+    async def connection(self):
+        yield FakeConnection(self)
+
+    def rows(self, query: str, args=()) -> list[dict]:
+        return [dict(row) for row in self.sqlite.execute(query, args)]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(database_async, "get_connection", fake.connection)
+    monkeypatch.setattr(database_async, "top_search_cache", database_async.TopSearchCache())
+    yield fake
+    fake.sqlite.close()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# Users
+
+def test_insert_user_if_new(db):
+    user_id = run(database_async.insert_user_if_new("a@example.com", "hash-1"))
+    assert user_id == 1
+    assert run(database_async.insert_user_if_new("a@example.com", "hash-2")) is None
+    assert db.rows("SELECT email, hashed_password FROM users") == [
+        {"email": "a@example.com", "hashed_password": "hash-1"}
+    ]
+    assert any("FOR UPDATE" in statement for statement in db.statements)
+
+
+def test_insert_user_if_new_rolls_back_on_error(db):
+    db.sqlite.execute("CREATE TRIGGER fail BEFORE INSERT ON users BEGIN SELECT RAISE(ABORT, 'boom'); END")
+    with pytest.raises(sqlite3.DatabaseError):
+        run(database_async.insert_user_if_new("a@example.com", "hash"))
+    assert not db.sqlite.in_transaction
+
+
+def test_register_then_login(db):
+    registered = run(database_async._register_logic("new@example.com", "Passw0rd"))
+    assert registered["success"] is True
+
+    assert run(database_async._login_logic("new@example.com", "Passw0rd"))["user_id"] == registered["user_id"]
+    assert run(database_async._login_logic("new@example.com", "wrong"))["success"] is False
+    assert run(database_async._login_logic("nobody@example.com", "Passw0rd"))["success"] is False
+
+    again = run(database_async._register_logic("new@example.com", "Passw0rd"))
+    assert again == {"success": False, "error": "Email already in use."}
+
+
+def test_register_rejects_weak_password(db):
+    assert run(database_async._register_logic("new@example.com", "weak"))["success"] is False
+    assert db.rows("SELECT * FROM users") == []
+
+
+def test_login_rehashes_outdated_hash(db):
+    old_hash = hash_password_sync("Passw0rd", rounds=4)
+    run(database_async.insert_user_if_new("old@example.com", old_hash))
+
+    assert run(database_async._login_logic("old@example.com", "Passw0rd"))["success"] is True
+
+    [user] = db.rows("SELECT hashed_password FROM users")
+    assert user["hashed_password"] != old_hash
+    assert hash_rounds(user["hashed_password"]) == BCRYPT_ROUNDS
+    # The upgraded hash still verifies, and isn't rewritten again
+    statements = len(db.statements)
+    assert run(database_async._login_logic("old@example.com", "Passw0rd"))["success"] is True
+    assert not any("UPDATE users" in s for s in db.statements[statements:])
+
+
+def test_failed_login_keeps_outdated_hash(db):
+    old_hash = hash_password_sync("Passw0rd", rounds=4)
+    run(database_async.insert_user_if_new("old@example.com", old_hash))
+
+    assert run(database_async._login_logic("old@example.com", "Wr0ngpass"))["success"] is False
+    assert db.rows("SELECT hashed_password FROM users")[0]["hashed_password"] == old_hash
+
+
+# Searches
+
+def test_insert_search_rows_aggregates_by_canonical_key(db):
+    saved = run(database_async.insert_search_rows([
+        (1, "fish and chips", 2),
+        (1, "fish chips", 1),
+        (1, "milks", 1),
+        (2, "fish and chips", 1),
+        (2, "the milk", 1),
+    ]))
+    assert saved == 5
+
+    stats = db.rows("SELECT user_id, search_key, hits FROM search_word_stats ORDER BY user_id, search_key")
+    assert stats == [
+        {"user_id": 1, "search_key": "chip fish", "hits": 3},
+        {"user_id": 1, "search_key": "milk", "hits": 1},
+        {"user_id": 2, "search_key": "chip fish", "hits": 1},
+        {"user_id": 2, "search_key": "milk", "hits": 1},
+    ]
+    variants = db.rows("SELECT search_word, hits FROM search_variants WHERE search_key = 'chip fish' ORDER BY search_word")
+    assert variants == [{"search_word": "fish and chips", "hits": 3}, {"search_word": "fish chips", "hits": 1}]
+
+
+def test_top_search_words_use_most_common_phrasing(db):
+    run(database_async.insert_search_rows([(1, "fish and chips", 3), (2, "fish chips", 1), (1, "milk", 1)]))
+
+    assert run(database_async.get_top_search_words(1)) == ["fish and chips", "milk"]
+    assert run(database_async.get_top_search_words(2)) == ["fish and chips"]
+    assert run(database_async.get_global_top_search_words()) == ["fish and chips", "milk"]
+
+
+def test_top_search_words_decay_with_age(db):
+    run(database_async.insert_search_rows([(1, "milk", 4)]))
+    db.now += timedelta(days=90)  # three half-lives: 4 hits now weigh 0.5
+    run(database_async.insert_search_rows([(1, "eggs", 1)]))
+
+    assert run(database_async.get_top_search_words(1)) == ["eggs", "milk"]
+    [milk] = db.rows("SELECT hits FROM search_word_stats WHERE search_key = 'milk'")
+    assert milk["hits"] == 4
+
+
+def test_top_search_cache_is_invalidated_by_writes(db):
+    run(database_async.insert_search_rows([(1, "milk", 1), (2, "bread", 1)]))
+    assert run(database_async.get_top_search_words(1)) == ["milk"]
+    assert run(database_async.get_top_search_words(2)) == ["bread"]
+
+    reads = len(db.statements)
+    assert run(database_async.get_top_search_words(1)) == ["milk"]
+    assert len(db.statements) == reads  # served from the LRU
+
+    run(database_async.insert_search_rows([(1, "eggs", 3)]))
+    assert run(database_async.get_top_search_words(1)) == ["eggs", "milk"]
+    # Only user 1's entry was dropped
+    reads = len(db.statements)
+    assert run(database_async.get_top_search_words(2)) == ["bread"]
+    assert len(db.statements) == reads
+
+
+def test_top_search_cache_lru_and_ttl(monkeypatch):
+    cache = database_async.TopSearchCache(size=2, ttl=60)
+    cache.put(1, 5, ["a"])
+    cache.put(2, 5, ["b"])
+    assert cache.get(1, 5) == ["a"]
+    cache.put(3, 5, ["c"])  # evicts user 2, the least recently used
+    assert cache.get(2, 5) is None
+    assert cache.get(1, 5) == ["a"]
+
+    now = database_async.time.monotonic()
+    monkeypatch.setattr(database_async.time, "monotonic", lambda: now + 61)
+    assert cache.get(1, 5) is None
+
+
+def test_insert_search_match_dedupes_phrasings(db):
+    assert run(database_async.insert_search_match(1, ["Fish & Chips", "fish  chips", ""])) == 1
+    assert db.rows("SELECT search_word FROM searches") == [{"search_word": "fish chips"}]
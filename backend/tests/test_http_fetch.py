@@ -0,0 +1,149 @@
+"""
+Browser-free fetch path, checked offline against hand-written store responses
+modelled on the markup each store serves.
+
+    python -m pytest backend/tests
+"""
+from pathlib import Path
+
+import httpx
+import pytest
+
+from backend import crawlers
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+@pytest.fixture(autouse=True)
+def reset_http_failures(monkeypatch):
+    monkeypatch.setattr(crawlers, "_http_failures", {})
+
+
+@pytest.fixture
+def fixture_http(monkeypatch):
+    """Serve the fixture responses from the shared HTTP client; returns the list of requested URLs."""
+    routes = {
+        "www.sainsburys.co.uk": ("application/json", fixture("sainsburys_api_milk.json")),
+        "groceries.morrisons.com": ("text/html", fixture("morrisons_search_milk.html")),
+        "home.bargains": ("text/html", fixture("homebargains_search_milk.html")),
+    }
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        content_type, body = routes[request.url.host]
+        return httpx.Response(200, text=body, headers={"Content-Type": content_type})
+
+    monkeypatch.setattr(crawlers, "_http_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(crawlers, "HTTP_FIRST_FETCH", True)
+    return requested
+
+
+def test_parse_sainsburys_api():
+    results = crawlers.parse_sainsburys_api(fixture("sainsburys_api_milk.json"))
+
+    assert results == [
+        [
+            "Sainsbury's British Semi Skimmed Milk 2.27L (4 pint)",
+            "£1.55",
+            "https://www.sainsburys.co.uk/gol-ui/product/sainsburys-british-semi-skimmed-milk-227l-4-pint",
+        ],
+        [
+            "Sainsbury's British Whole Milk 1.13L (2 pint)",
+            "£1.00",
+            "https://www.sainsburys.co.uk/gol-ui/product/sainsburys-british-whole-milk-113l-2-pint",
+        ],
+        [
+            "Cravendale Filtered Semi Skimmed Milk 2L",
+            "£3.25",
+            "https://www.sainsburys.co.uk/gol-ui/product/cravendale-semi-skimmed-milk-2l",
+        ],
+    ]
+
+
+def test_parse_sainsburys_api_empty_and_invalid():
+    assert crawlers.parse_sainsburys_api('{"products": []}') == []
+    assert crawlers.parse_sainsburys_api('{"controls": {}}') == []
+    with pytest.raises(ValueError):
+        crawlers.parse_sainsburys_api("<html>Access denied</html>")
+
+
+def test_parse_store_html_morrisons():
+    results = crawlers.parse_store_html(fixture("morrisons_search_milk.html"), "morrisons")
+
+    assert [name for name, _, _ in results] == [
+        "Morrisons British Semi Skimmed Milk 4 Pint",
+        "Morrisons Whole Milk 1 Pint",
+        "Arla Lactofree Semi Skimmed Milk 1L",
+    ]
+    assert [price for _, price, _ in results] == ["£1.55", "75p", "£1.95"]
+    assert results[0][2].endswith("/products/morrisons-british-semi-skimmed-milk-4-pint/110291011")
+
+
+def test_parse_store_html_homebargains_takes_current_price():
+    results = crawlers.parse_store_html(fixture("homebargains_search_milk.html"), "homebargains")
+
+    assert [(name, price) for name, price, _ in results] == [
+        ("Cadbury Dairy Milk Buttons 119g", "£1.49"),
+        ("Nesquik Strawberry Milkshake Powder 300g", "£2.29"),
+    ]
+
+
+def test_parse_store_html_client_rendered_shell_has_no_products():
+    # What home.bargains actually serves without JavaScript
+    assert crawlers.parse_store_html(fixture("homebargains_search_shell.html"), "homebargains") == []
+
+
+@pytest.mark.parametrize("site, count", [("sainsburys", 3), ("morrisons", 3)])
+def test_http_fetch_results(fixture_http, site, count):
+    assert len(crawlers.http_fetch_results(site, "semi skimmed milk")) == count
+    assert len(fixture_http) == 1
+    assert "semi%20skimmed%20milk" in fixture_http[0]
+
+
+def test_http_fetch_skips_stores_not_enabled(fixture_http):
+    assert "homebargains" not in crawlers.HTTP_FIRST_STORES
+    assert crawlers.http_fetch_results("homebargains", "milk") == []
+    assert fixture_http == []
+
+
+def test_http_fetch_falls_back_on_error(monkeypatch):
+    def handler(request):
+        return httpx.Response(403, text="Access denied")
+
+    monkeypatch.setattr(crawlers, "_http_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(crawlers, "HTTP_FIRST_FETCH", True)
+    assert crawlers.http_fetch_results("sainsburys", "milk") == []
+
+
+def test_http_fetch_suspends_failing_store(monkeypatch):
+    requested = []
+
+    def handler(request):
+        requested.append(request.url)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    monkeypatch.setattr(crawlers, "_http_client", httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(crawlers, "HTTP_FIRST_FETCH", True)
+    for _ in range(crawlers.HTTP_FIRST_MAX_FAILURES + 2):
+        assert crawlers.http_fetch_results("sainsburys", "milk") == []
+    assert len(requested) == crawlers.HTTP_FIRST_MAX_FAILURES
+    # Other stores keep their HTTP path
+    assert crawlers.http_fetch_results("morrisons", "milk") == []
+    assert len(requested) == crawlers.HTTP_FIRST_MAX_FAILURES + 1
+
+    # Tried again once the cooldown is over
+    later = crawlers.time.monotonic() + crawlers.HTTP_FIRST_COOLDOWN + 1
+    monkeypatch.setattr(crawlers.time, "monotonic", lambda: later)
+    crawlers.http_fetch_results("sainsburys", "milk")
+    assert len(requested) == crawlers.HTTP_FIRST_MAX_FAILURES + 2
+
+
+def test_http_fetch_success_resets_failures(fixture_http):
+    crawlers._record_http_result("sainsburys", ok=False)
+    assert len(crawlers.http_fetch_results("sainsburys", "milk")) == 3
+    assert "sainsburys" not in crawlers._http_failures
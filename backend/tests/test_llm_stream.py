@@ -0,0 +1,201 @@
+"""
+Streaming LLM extraction against a local fake Ollama server.
+
+    python -m pytest backend/tests
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ollama
+import pytest
+
+from backend import crawlers
+
+
+def product(i: int) -> dict:
+    return {"name": f"Product {i}", "price": f"£{i}.50", "href": f"/p/{i}"}
+
+
+def as_chunks(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeOllama:
+    """
+    Answers POST /api/chat with the scripted content chunks as Ollama's
+    NDJSON stream, one line per chunk with a short pause between them.
+    Records the request and how far the stream got before the client hung up.
+    """
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.delay = 0.005
+        self.requests: list[dict] = []
+        self.sent = 0
+        self.disconnected = False
+        self.finished = threading.Event()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                fake.requests.append(json.loads(self.rfile.read(length)))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for chunk in fake.chunks:
+                        self._line({"message": {"role": "assistant", "content": chunk}, "done": False})
+                        fake.sent += 1
+                        time.sleep(fake.delay)
+                    self._line({"message": {"role": "assistant", "content": ""}, "done": True})
+                except (BrokenPipeError, ConnectionResetError):
+                    fake.disconnected = True
+                finally:
+                    fake.finished.set()
+
+            def _line(self, obj):
+                self.wfile.write((json.dumps(obj) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    fake = FakeOllama()
+    monkeypatch.setattr(crawlers.ollama, "chat", ollama.Client(host=fake.url).chat)
+    yield fake
+    fake.close()
+
+
+def test_parser_skips_preamble_and_fences():
+    parser = crawlers._ProductStreamParser()
+    items = parser.feed('Sure! Here are the products:\n```json\n[\n  ' + json.dumps(product(1)) + "\n]\n```")
+    assert items == [product(1)]
+    assert parser.closed
+
+
+def test_parser_ignores_brackets_in_preamble():
+    parser = crawlers._ProductStreamParser()
+    items = []
+    for chunk in as_chunks("Here [are] the products: [" + json.dumps(product(1)) + "]", 3):
+        items += parser.feed(chunk)
+    assert items == [product(1)]
+    assert parser.closed
+
+
+def test_parser_waits_for_split_elements():
+    parser = crawlers._ProductStreamParser()
+    text = json.dumps([product(1), product(2)])
+    first, second = text[:20], text[20:]
+    assert parser.feed(first) == []
+    assert parser.feed(second) == [product(1), product(2)]
+
+
+def test_chunk_html_keeps_text_between_split_children():
+    cards = "".join(f"<span>Product {i}</span> £{i}.50 " for i in range(30))
+    html = f"<html><body><div>Offers £1 off <b>today</b> {cards}</div></body></html>"
+
+    chunks = crawlers.chunk_html(html, 120)
+
+    assert len(chunks) > 1
+    text = "\n".join(chunks)
+    assert "Offers £1 off" in text
+    assert all(f"<span>Product {i}</span> £{i}.50" in text for i in range(30))
+
+
+@pytest.mark.parametrize("price, expected", [
+    ("£1.50", "£1.50"), ("75p", "75p"), (1.5, "£1.50"), ("1.50", "£1.50"), (" 2 ", "£2.00"),
+])
+def test_validate_product_prices(price, expected):
+    assert crawlers._validate_product({"name": "Milk", "price": price, "href": "/p/1"}) == ["Milk", expected, "/p/1"]
+
+
+@pytest.mark.parametrize("price", ["", "free", "1.505", True, None])
+def test_validate_product_rejects_non_prices(price):
+    assert crawlers._validate_product({"name": "Milk", "price": price, "href": "/p/1"}) is None
+
+
+def test_call_model_with_preamble(fake_ollama):
+    fake_ollama.chunks = ["Here [are] the products:\n", "```json\n", json.dumps([product(1), product(2)]), "\n```"]
+
+    results = crawlers._call_model("fake-model", "prompt")
+
+    assert results == [["Product 1", "£1.50", "/p/1"], ["Product 2", "£2.50", "/p/2"]]
+    request = fake_ollama.requests[0]
+    assert request["model"] == "fake-model"
+    assert request["stream"] is True
+    assert request["format"] == crawlers.PRODUCTS_SCHEMA
+
+
+def test_call_model_streams_products_as_they_arrive(fake_ollama):
+    fake_ollama.chunks = as_chunks(json.dumps([product(i) for i in range(1, 6)]), 7)
+    seen = []
+
+    results = crawlers._call_model("fake-model", "prompt", on_product=lambda row: seen.append((row, fake_ollama.sent)))
+
+    assert [row for row, _ in seen] == results
+    assert len(results) == 5
+    # The first product was handed over well before the last chunk was sent
+    assert seen[0][1] < len(fake_ollama.chunks) // 2
+
+
+def test_call_model_cancels_when_array_closes(fake_ollama):
+    fake_ollama.chunks = [json.dumps([product(1)]), "\n\nI hope this helps!"] + [" More text."] * 400
+
+    results = crawlers._call_model("fake-model", "prompt")
+
+    assert results == [["Product 1", "£1.50", "/p/1"]]
+    assert fake_ollama.finished.wait(5)
+    assert fake_ollama.disconnected
+    assert fake_ollama.sent < len(fake_ollama.chunks)
+
+
+def test_call_model_cancels_at_product_cap(fake_ollama, monkeypatch):
+    monkeypatch.setattr(crawlers, "LLM_MAX_PRODUCTS", 3)
+    fake_ollama.chunks = ["["] + [json.dumps(product(i)) + "," for i in range(1, 301)] + ["]"]
+
+    results = crawlers._call_model("fake-model", "prompt")
+
+    assert len(results) == 3
+    assert fake_ollama.finished.wait(5)
+    assert fake_ollama.disconnected
+    assert fake_ollama.sent < len(fake_ollama.chunks)
+
+
+def test_call_model_recovers_from_whole_response(fake_ollama):
+    # The echoed schema starts like the array but never parses, so nothing
+    # comes out incrementally; the full response still holds the real array
+    text = "Schema: [{name, price, href}]\nResult:\n" + json.dumps([product(1), product(2)])
+    fake_ollama.chunks = as_chunks(text, 10)
+    seen = []
+
+    results = crawlers._call_model("fake-model", "prompt", on_product=seen.append)
+
+    assert results == [["Product 1", "£1.50", "/p/1"], ["Product 2", "£2.50", "/p/2"]]
+    assert seen == results
+
+
+def test_call_model_empty_array_is_a_valid_answer(fake_ollama):
+    fake_ollama.chunks = ["Here [are] no products: ", "[]"]
+    assert crawlers._call_model("fake-model", "prompt") == []
+
+
+def test_call_model_rejects_unusable_output(fake_ollama):
+    fake_ollama.chunks = ["I could not find any products on this page."]
+    with pytest.raises(crawlers._LLMOutputError):
+        crawlers._call_model("fake-model", "prompt")
@@ -0,0 +1,32 @@
+"""
+Search-query canonicalisation.
+
+    python -m pytest backend/tests
+"""
+import pytest
+
+from backend.query_canon import canonical_query, display_query, search_count_key, singularise
+
+
+@pytest.mark.parametrize("word, singular", [
+    ("milks", "milk"), ("tomatoes", "tomato"), ("shoes", "shoe"), ("canoes", "canoe"),
+    ("boxes", "box"), ("peaches", "peach"), ("glasses", "glass"), ("hummus", "hummus"),
+])
+def test_singularise(word, singular):
+    assert singularise(word) == singular
+
+
+def test_canonical_query_folds_phrasing_but_keeps_word_order():
+    assert canonical_query("The Semi-Skimmed Milks ") == "semi skimmed milk"
+    assert canonical_query("milk chocolate") != canonical_query("chocolate milk")
+    assert canonical_query("hot dogs") == "hot dog"
+    assert canonical_query("mince") != canonical_query("minced")
+
+
+def test_search_count_key_ignores_word_order():
+    assert search_count_key("fish and chips") == search_count_key("chips, fish") == "chip fish"
+    assert search_count_key("") == ""
+
+
+def test_display_query():
+    assert display_query("  Fish & Chips ") == "fish chips"
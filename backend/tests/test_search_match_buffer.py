@@ -0,0 +1,102 @@
+"""
+Write-behind buffer for /api/search-matches, with an in-memory writer.
+
+    python -m pytest backend/tests
+"""
+import asyncio
+
+from backend.search_match_buffer import SearchMatchBuffer
+
+
+class FakeWriter:
+    def __init__(self, delay: float = 0.0, failures: int = 0):
+        self.delay = delay
+        self.failures = failures
+        self.batches = []
+
+    async def __call__(self, rows):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database down")
+        self.batches.append(rows)
+        return len(rows)
+
+    @property
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+def test_add_counts_hits_per_phrasing():
+    buffer = SearchMatchBuffer()
+    assert buffer.add(1, ["Semi-Skimmed Milk", "semi skimmed  milk", "the", ""]) == 2
+    buffer.add(1, ["semi skimmed milk"])
+    assert buffer._rows == {(1, "semi skimmed milk"): 2, (1, "the"): 1}
+
+
+def test_flushes_on_size_threshold():
+    async def run():
+        writer = FakeWriter()
+        buffer = SearchMatchBuffer(flush_rows=2, flush_interval=60, writer=writer)
+        await buffer.start()
+        buffer.add(1, ["milk", "eggs"])
+        await asyncio.sleep(0.05)
+        flushed_before_stop = list(writer.rows)
+        await buffer.stop()
+        return flushed_before_stop
+
+    assert asyncio.run(run()) == [(1, "milk", 1), (1, "eggs", 1)]
+
+
+def test_stop_waits_for_write_in_progress():
+    async def run():
+        writer = FakeWriter(delay=0.3)
+        buffer = SearchMatchBuffer(flush_rows=1, flush_interval=60, writer=writer)
+        await buffer.start()
+        buffer.add(1, ["milk"])
+        await asyncio.sleep(0.05)  # flusher is now inside the slow write
+        buffer.add(2, ["eggs"])
+        await buffer.stop()
+        return writer, buffer
+
+    writer, buffer = asyncio.run(run())
+    assert sorted(writer.rows) == [(1, "milk", 1), (2, "eggs", 1)]
+    assert buffer.stats()["pending"] == 0
+    assert buffer.stats()["dropped"] == 0
+
+
+def test_cancelled_flush_requeues_rows():
+    async def run():
+        buffer = SearchMatchBuffer(writer=FakeWriter(delay=1))
+        buffer.add(1, ["milk"])
+        task = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return buffer
+
+    assert asyncio.run(run())._rows == {(1, "milk"): 1}
+
+
+def test_failed_flush_is_retried_on_stop():
+    async def run():
+        writer = FakeWriter(failures=1)
+        buffer = SearchMatchBuffer(flush_rows=1, flush_interval=60, writer=writer)
+        await buffer.start()
+        buffer.add(1, ["milk"])
+        await asyncio.sleep(0.05)
+        buffer.add(1, ["milk"])
+        await buffer.stop()
+        return writer, buffer
+
+    writer, buffer = asyncio.run(run())
+    assert writer.rows == [(1, "milk", 2)]
+    assert buffer.stats()["failures"] == 1
+
+
+def test_drops_oldest_rows_past_the_cap():
+    buffer = SearchMatchBuffer(flush_rows=2, max_rows=3)
+    for user_id in range(5):
+        buffer.add(user_id, ["milk"])
+    assert list(buffer._rows) == [(2, "milk"), (3, "milk"), (4, "milk")]
+    assert buffer.stats()["dropped"] == 2
@@ -0,0 +1,165 @@
+import os
+import re
+import threading
+from collections import Counter
+
+from .database_ops import get_search_word_counts, iter_catalogue_products
+from .query_canon import display_query, search_count_key
+
+# In-memory typeahead over past search words and crawled product names.
+#
+# Terms live in a character trie where every node keeps its own top-k terms
+# by score, so a lookup is a walk down the prefix and a copy of one short
+# list. Scores are updated incrementally as search words are saved and new
+# crawls land. Nodes stop branching at TYPEAHEAD_MAX_DEPTH characters;
+# deeper prefixes filter the terms held by the last node.
+#
+# Score = searches * TYPEAHEAD_SEARCH_WEIGHT + products whose name contains
+# the term (product words and word pairs are indexed, not whole names).
+#
+# Searches are counted per search_count_key and suggested as the key's most
+# common phrasing, so "semi skimmed milk" and "Semi-skimmed milks" add up
+# to one suggestion. Live updates and the startup load both see the words
+# as typed.
+
+TYPEAHEAD_TOP_K = int(os.environ.get("TYPEAHEAD_TOP_K", "10"))
+TYPEAHEAD_MAX_DEPTH = int(os.environ.get("TYPEAHEAD_MAX_DEPTH", "12"))
+TYPEAHEAD_SEARCH_WEIGHT = int(os.environ.get("TYPEAHEAD_SEARCH_WEIGHT", "20"))
+
+_WORD_RE = re.compile(r"[a-z]{3,}")
+
+
+class _Node:
+    __slots__ = ("children", "top", "terms")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # [(score, term)], best first, at most TYPEAHEAD_TOP_K
+        self.terms = None  # set of every term below, only at TYPEAHEAD_MAX_DEPTH
+
+
+class Typeahead:
+    def __init__(self, top_k: int = TYPEAHEAD_TOP_K, max_depth: int = TYPEAHEAD_MAX_DEPTH):
+        self.top_k = top_k
+        self.max_depth = max_depth
+        self._root = _Node()
+        self._searches = Counter()
+        self._products = Counter()
+        self._variants: dict[str, Counter] = {}  # count key -> {phrasing: searches}
+        self._shown: dict[str, str] = {}  # count key -> phrasing it's suggested as
+        self._lock = threading.Lock()
+
+    def _score(self, term: str) -> int:
+        return self._searches[term] * TYPEAHEAD_SEARCH_WEIGHT + self._products[term]
+
+    def _update(self, term: str) -> None:
+        """Re-rank `term` along its path after its counts changed. Caller holds the lock."""
+        score = self._score(term)
+        node = self._root
+        path = [node]
+        for ch in term[:self.max_depth]:
+            node = node.children.get(ch)
+            if node is None:
+                node = path[-1].children[ch] = _Node()
+            path.append(node)
+        if len(term) > self.max_depth:
+            if node.terms is None:
+                node.terms = set()
+            node.terms.add(term)
+
+        for node in path:
+            top = [entry for entry in node.top if entry[1] != term]
+            if score <= 0:
+                pass  # no longer suggested
+            elif len(top) < self.top_k or score > top[-1][0]:
+                top.append((score, term))
+                top.sort(key=lambda entry: (-entry[0], entry[1]))
+                del top[self.top_k:]
+            node.top = top
+
+    def _add_search(self, word: str, count: int) -> None:
+        """Count `count` searches for `word` as typed. Caller holds the lock."""
+        term, key = display_query(word), search_count_key(word)
+        if not term or not key:
+            return
+        variants = self._variants.setdefault(key, Counter())
+        variants[term] += count
+        shown = self._shown.get(key)
+        if shown is not None and shown != term and variants[shown] >= variants[term]:
+            term = shown
+        elif shown is not None and shown != term:
+            # A new phrasing overtook the shown one; move the key's count across
+            del self._searches[shown]
+            self._update(shown)
+        self._shown[key] = term
+        self._searches[term] = sum(variants.values())
+        self._update(term)
+
+    def add_search_words(self, words, count: int = 1) -> None:
+        with self._lock:
+            for word in words:
+                self._add_search(word, count)
+
+    def add_search_counts(self, counts: dict) -> None:
+        """Add {word as typed: searches}, e.g. from get_search_word_counts()."""
+        with self._lock:
+            for word, count in counts.items():
+                self._add_search(word, count)
+
+    def add_product_names(self, names) -> None:
+        """Index the words and adjacent word pairs of product names."""
+        seen = Counter()
+        for name in names:
+            words = _WORD_RE.findall(name.lower())
+            seen.update(set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])})
+        with self._lock:
+            for term, count in seen.items():
+                self._products[term] += count
+                self._update(term)
+
+    def suggest(self, prefix: str, limit: int = TYPEAHEAD_TOP_K) -> list[tuple[str, int]]:
+        """Up to `limit` (term, score) pairs starting with `prefix`, best first."""
+        prefix = display_query(prefix)
+        if not prefix:
+            return []
+        node = self._root
+        for ch in prefix[:self.max_depth]:
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        if len(prefix) <= self.max_depth:
+            return [(term, score) for score, term in node.top[:limit]]
+
+        # Past the trie's depth: rank the few terms stored at the last node
+        with self._lock:
+            matches = [(self._score(t), t) for t in (node.terms or ()) if t.startswith(prefix)]
+            matches = [entry for entry in matches if entry[0] > 0]
+        matches.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [(term, score) for score, term in matches[:limit]]
+
+    def __len__(self) -> int:
+        return len(self._searches.keys() | self._products.keys())
+
+
+typeahead_index = Typeahead()
+
+
+def load_typeahead() -> None:
+    """Fill typeahead_index from the searches and products tables."""
+    try:
+        typeahead_index.add_search_counts(get_search_word_counts())
+        batch = []
+        for product in iter_catalogue_products():
+            batch.append(product["name"])
+            if len(batch) >= 5000:
+                typeahead_index.add_product_names(batch)
+                batch = []
+        typeahead_index.add_product_names(batch)
+    except Exception as e:
+        print(f"[Typeahead] Could not load suggestions: {e}")
+        return
+    print(f"[Typeahead] Index holds {len(typeahead_index)} terms.")
+
+
+def start_typeahead_load() -> None:
+    threading.Thread(target=load_typeahead, name="typeahead-load", daemon=True).start()
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from .crawl_engine import crawl_engine
+from .crawlers import STORE_CRAWLERS
+from .database_async import get_global_top_search_words
+from .search_cache import result_cache
+
+# Background pre-crawler that keeps popular searches hot on the server.
+#
+# Once per round it takes the most searched words across all users and
+# crawls any that aren't already cached, through the same crawl engine as
+# interactive searches. Rounds only run inside the off-peak window, and each
+# store crawls at most one warm-up query at a time with a pause in between,
+# so warming never holds more than one browser per store.
+#
+# A user's own top searches (see /api/user/{id}/top-searches) can be queued
+# with queue_terms(). Those are held until the off-peak window too (up to
+# WARMUP_HELD_MAX distinct queries) and warmed ahead of the global ones.
+
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") != "0"
+WARMUP_TOP_N = int(os.environ.get("WARMUP_TOP_N", "50"))
+# Seconds between global rounds
+WARMUP_INTERVAL = float(os.environ.get("WARMUP_INTERVAL", "3600"))
+# Local hours [start, end) in which global rounds may run, e.g. "1-6" or "22-5"
+WARMUP_OFF_PEAK_HOURS = os.environ.get("WARMUP_OFF_PEAK_HOURS", "0-7")
+# Pause after each warm-up crawl, per store
+WARMUP_STORE_DELAY = float(os.environ.get("WARMUP_STORE_DELAY", "20"))
+# Per-user queries waiting for the off-peak window; the oldest are dropped past this
+WARMUP_HELD_MAX = int(os.environ.get("WARMUP_HELD_MAX", "500"))
+
+WARMUP_CLIENT_ID = "warmup"
+
+
+def _parse_hours(spec: str) -> tuple[int, int]:
+    start, _, end = spec.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+def in_off_peak(now: datetime = None, hours: str = WARMUP_OFF_PEAK_HOURS) -> bool:
+    start, end = _parse_hours(hours)
+    hour = (now or datetime.now()).hour
+    if start == end:
+        return True  # "0-0": any time
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end  # window wraps midnight
+
+
+class WarmupScheduler:
+    def __init__(self, key_fn, top_n: int = WARMUP_TOP_N, interval: float = WARMUP_INTERVAL,
+                 store_delay: float = WARMUP_STORE_DELAY):
+        self.key_fn = key_fn
+        self.top_n = top_n
+        self.interval = interval
+        self.store_delay = store_delay
+        self._loop = None
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._queued: dict[str, set] = {}
+        self._held: dict[str, str] = {}  # key -> query, oldest first
+        self._tasks: list[asyncio.Task] = []
+        self._warmed = 0
+        self._last_round = None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queues = {store: asyncio.Queue() for store in STORE_CRAWLERS}
+        self._queued = {store: set() for store in STORE_CRAWLERS}
+        for store in STORE_CRAWLERS:
+            self._tasks.append(asyncio.create_task(self._store_worker(store), name=f"warmup-{store}"))
+        self._tasks.append(asyncio.create_task(self._rounds(), name="warmup-rounds"))
+        print(f"[Warmup] Started (top {self.top_n}, off-peak hours {WARMUP_OFF_PEAK_HOURS}).")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        print("[Warmup] Stopped.")
+
+    def queue_terms(self, terms: list[str]) -> None:
+        """Warm `terms` in the off-peak window. Safe to call from any thread."""
+        if self._loop is None or not self._tasks:
+            return
+        self._loop.call_soon_threadsafe(self._hold, list(terms))
+
+    def _hold(self, terms: list[str]) -> None:
+        if in_off_peak():
+            self._enqueue(terms)
+            return
+        for term in terms:
+            key = self.key_fn(term)
+            if key and key not in self._held:
+                self._held[key] = term
+        for key in list(self._held)[:max(0, len(self._held) - WARMUP_HELD_MAX)]:
+            del self._held[key]
+
+    def _enqueue(self, terms: list[str]) -> None:
+        for term in terms:
+            key = self.key_fn(term)
+            if not key:
+                continue
+            for store, queue in self._queues.items():
+                if key in self._queued[store] or result_cache.get(key, store) is not None:
+                    continue
+                self._queued[store].add(key)
+                queue.put_nowait((term, key))
+
+    async def _rounds(self) -> None:
+        while True:
+            if in_off_peak():
+                try:
+                    words = await get_global_top_search_words(self.top_n)
+                except Exception as e:
+                    print(f"[Warmup] Could not load top searches: {e}")
+                else:
+                    held, self._held = list(self._held.values()), {}
+                    print(f"[Warmup] Round: {len(held)} user and {len(words)} popular search(es).")
+                    self._enqueue(held + words)
+                    self._last_round = time.time()
+                await asyncio.sleep(self.interval)
+            else:
+                await asyncio.sleep(min(self.interval, 600))
+
+    async def _store_worker(self, store: str) -> None:
+        queue = self._queues[store]
+        while True:
+            term, key = await queue.get()
+            try:
+                # Re-check: an interactive search may have filled it meanwhile
+                if result_cache.get(key, store) is None:
+                    await crawl_engine.submit(term, key, store, WARMUP_CLIENT_ID)
+                    self._warmed += 1
+            except Exception as e:
+                print(f"[Warmup] {store} warm-up for {key!r} failed: {e}")
+            finally:
+                self._queued[store].discard(key)
+            await asyncio.sleep(self.store_delay)
+
+    def stats(self) -> dict:
+        return {
+            "queued": {store: queue.qsize() for store, queue in self._queues.items()},
+            "held": len(self._held),
+            "warmed": self._warmed,
+            "last_round": self._last_round,
+        }
@@ -1,14 +1,15 @@
 import { Component } from '@angular/core';
 import { FormsModule } from '@angular/forms';
 import { Router } from '@angular/router';
-import { Search } from '../../services/search';
+import { Search, TypeaheadSuggestion } from '../../services/search';
 import { Auth } from '../../auth/auth';
-import { NgIf } from '@angular/common';
+import { NgForOf, NgIf } from '@angular/common';
+import { Subject, debounceTime, distinctUntilChanged, switchMap, take } from 'rxjs';
 
 @Component({
   selector: 'app-home',
   standalone: true,
-  imports: [FormsModule, NgIf],
+  imports: [FormsModule, NgIf, NgForOf],
   templateUrl: './home.html',
   styleUrl: './home.scss',
 })
@@ -16,6 +17,8 @@ export class Home {
   query = '';
   loading = false;
   error: string | null = null;
+  suggestions: TypeaheadSuggestion[] = [];
+  private typed = new Subject<string>();
 
   constructor(
     private search: Search,
@@ -26,6 +29,18 @@ export class Home {
     if (user?.id) {
       this.search.prefetchTopSearches(user.id);
     }
+
+    this.typed
+      .pipe(
+        debounceTime(150),
+        distinctUntilChanged(),
+        switchMap((prefix) => this.search.suggest(prefix)),
+      )
+      .subscribe((suggestions) => (this.suggestions = suggestions));
+  }
+
+  onQueryChange(value: string): void {
+    this.typed.next(value);
   }
 
   get isLoggedIn(): boolean {
@@ -40,8 +55,10 @@ export class Home {
       return;
     }
 
+    // Results streams in per store, so go there as soon as the first one lands;
+    // Results joins this same stream (Search shares it by query)
     this.loading = true;
-    this.search.search(trimmed).subscribe({
+    this.search.search(trimmed).pipe(take(1)).subscribe({
       next: () => {
         this.loading = false;
         this.router.navigate(['/results'], { queryParams: { q: trimmed } });
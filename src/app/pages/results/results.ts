@@ -1,7 +1,7 @@
 import { Component, OnInit } from '@angular/core';
 import { ActivatedRoute, Router } from '@angular/router';
 import { NgForOf, NgIf, AsyncPipe, CommonModule } from '@angular/common';
-import { Search, SearchResultPayload, ItemRow } from '../../services/search';
+import { Search, SearchResultPayload, ItemRow, PriceComparison } from '../../services/search';
 import { Auth } from '../../auth/auth';
 import { FormsModule } from '@angular/forms';
 import { Basket, BasketItem } from '../../services/basket';
@@ -17,6 +17,8 @@ import { Observable, switchMap, of } from 'rxjs';
 export class Results implements OnInit {
   query = '';
   results: SearchResultPayload['results'] | null = null;
+  // Server-parsed prices, keyed by `${store}:${index}`
+  private comparison = new Map<string, PriceComparison>();
   loading = false;
   error: string | null = null;
   items$: Observable<BasketItem[]>;
@@ -57,6 +59,7 @@ export class Results implements OnInit {
         const q = (params['q'] ?? '').trim();
         this.query = q;
         this.results = null;
+        this.comparison.clear();
         this.error = null;
 
         if (!q) {
@@ -72,6 +75,9 @@ export class Results implements OnInit {
         if (resp === null) return;
         this.loading = false;
         this.results = resp.results;
+        this.comparison = new Map(
+          (resp.comparison ?? []).map((row) => [`${row.store}:${row.index}`, row]),
+        );
         this.initializeQuantities();
       },
       error: () => {
@@ -117,14 +123,29 @@ export class Results implements OnInit {
     return `${market}:${item[0]}:${index}`;
   }
 
-  addToBasket(item: ItemRow, market: string, quantity: number): void {
+  unitPriceLabel(market: string, index: number): string {
+    const row = this.comparison.get(`${market}:${index}`);
+    if (!row || row.unit_price_pence === null) return '';
+    const price = row.unit_price_pence < 100
+      ? `${row.unit_price_pence.toFixed(1)}p`
+      : `£${(row.unit_price_pence / 100).toFixed(2)}`;
+    return `${price} ${row.unit_label}`;
+  }
+
+  addToBasket(item: ItemRow, market: string, quantity: number, index: number): void {
     const [title, priceStr] = item;
     let unitPrice = 0;
-    const normalized = priceStr.trim().toLowerCase();
-    if (normalized.endsWith('p')) {
-      unitPrice = parseFloat(normalized.replace(/[^0-9.]/g, '')) / 100;
+    const parsed = this.comparison.get(`${market}:${index}`);
+    if (parsed) {
+      unitPrice = parsed.price_pence / 100;
     } else {
-      unitPrice = parseFloat(normalized.replace(/[^0-9.]/g, '')) || 0;
+      // Still streaming — the server hasn't ranked this store yet
+      const normalized = priceStr.trim().toLowerCase();
+      if (normalized.endsWith('p')) {
+        unitPrice = parseFloat(normalized.replace(/[^0-9.]/g, '')) / 100;
+      } else {
+        unitPrice = parseFloat(normalized.replace(/[^0-9.]/g, '')) || 0;
+      }
     }
     this.basket.add({ title, unitPrice, market, quantity }, quantity);
   }
@@ -134,7 +155,7 @@ export class Results implements OnInit {
     const quantity = Math.max(1, this.quantities[market]?.[index] ?? 1);
     const triggerAnimation = () => {
       this.animatingKeys.add(key);
-      this.addToBasket(item, market, quantity);
+      this.addToBasket(item, market, quantity, index);
       setTimeout(() => this.animatingKeys.delete(key), 600);
     };
     if (this.animatingKeys.has(key)) {
@@ -1,12 +1,32 @@
 import { Injectable } from '@angular/core';
-import { HttpClient } from '@angular/common/http';
-import { Observable, of } from 'rxjs';
-import { tap } from 'rxjs/operators';
+import { HttpClient, HttpDownloadProgressEvent, HttpEvent, HttpEventType } from '@angular/common/http';
+import { Observable, ReplaySubject, catchError, finalize, map, of, share, timer } from 'rxjs';
 
 const SEARCH_CACHE_KEY = 'searchCache_v2';
+// How long a search stream stays open after its last subscriber leaves, so
+// Results can pick up the stream Home started across the navigation
+const INFLIGHT_GRACE_MS = 10000;
 
 export type ItemRow = [string, string, string?]; // [name, price, href?]
 
+// One product ranked by /api/search — cheapest per unit first
+export interface PriceComparison {
+  store: string;
+  index: number; // position in results[store]
+  name: string;
+  price_pence: number;
+  unit: 'g' | 'ml' | 'each' | null;
+  pack_amount: number | null;
+  unit_price_pence: number | null;
+  unit_label: string | null; // "per 100g", "per 100ml", "each"
+}
+
+// The same product found in several stores — one item per store, cheapest first
+export interface MatchGroup {
+  name: string;
+  items: { store: string; index: number; name: string; price_pence: number | null }[];
+}
+
 export interface SearchResultPayload {
   query: string;
   key: string;
@@ -15,6 +35,9 @@ export interface SearchResultPayload {
     homebargains: ItemRow[];
     morrisons: ItemRow[];
   };
+  pending?: string[]; // stores that timed out; their crawl finishes server-side
+  comparison?: PriceComparison[];
+  matches?: MatchGroup[];
 }
 
 export interface CrawlerItem {
@@ -26,8 +49,30 @@ export interface CrawlerItem {
 
 export type SearchResponse = SearchResultPayload;
 
+export interface TypeaheadSuggestion {
+  term: string;
+  score: number;
+  cached: boolean; // every store can answer this without a crawl
+}
+
+type StoreKey = keyof SearchResultPayload['results'];
+
+// One NDJSON line from /api/search/stream
+type SearchStreamEvent =
+  | { type: 'product'; store: StoreKey; product: ItemRow }
+  | { type: 'store'; store: StoreKey; results: ItemRow[] }
+  | {
+      type: 'done';
+      query: string;
+      key: string;
+      pending: string[];
+      comparison: PriceComparison[];
+      matches: MatchGroup[];
+    };
+
 type SearchCache = Record<string, SearchResultPayload>;
 
+// Browser cache key only; the server canonicalises further (plurals, stop words, synonyms)
 function normalizeQuery(q: string): string {
   return q
     .toLowerCase()
@@ -39,6 +84,8 @@ function normalizeQuery(q: string): string {
 @Injectable({ providedIn: 'root' })
 export class Search {
   private lastResult: SearchResultPayload | null = null;
+  // Streams still downloading, by local key; late subscribers get the latest payload
+  private inflight = new Map<string, Observable<SearchResultPayload>>();
 
   constructor(private http: HttpClient) {}
 
@@ -59,6 +106,38 @@ export class Search {
     }
   }
 
+  // Parse an NDJSON response as it downloads, emitting one value per complete line
+  private ndjson<T>(events$: Observable<HttpEvent<string>>): Observable<T> {
+    return new Observable<T>((subscriber) => {
+      let consumed = 0;
+
+      const consume = (text: string) => {
+        const end = text.lastIndexOf('\n') + 1;
+        if (end <= consumed) return;
+        text
+          .slice(consumed, end)
+          .split('\n')
+          .filter((line) => line.trim())
+          .forEach((line) => subscriber.next(JSON.parse(line) as T));
+        consumed = end;
+      };
+
+      const sub = events$.subscribe({
+        next: (event) => {
+          if (event.type === HttpEventType.DownloadProgress) {
+            consume((event as HttpDownloadProgressEvent).partialText ?? '');
+          } else if (event.type === HttpEventType.Response) {
+            consume(event.body ?? '');
+          }
+        },
+        error: (err) => subscriber.error(err),
+        complete: () => subscriber.complete(),
+      });
+
+      return () => sub.unsubscribe();
+    });
+  }
+
   search(query: string): Observable<SearchResultPayload> {
     const trimmed = query.trim();
     if (!trimmed) {
@@ -77,36 +156,89 @@ export class Search {
       return of(cache[key]);
     }
 
+    const inflight = this.inflight.get(key);
+    if (inflight) return inflight;
+
+    const stream$ = new Observable<SearchResultPayload>((subscriber) => {
+      const payload: SearchResultPayload = {
+        query: trimmed,
+        key,
+        results: { sainsburys: [], homebargains: [], morrisons: [] },
+      };
+      const finished = new Set<StoreKey>();
+
+      const apply = (event: SearchStreamEvent) => {
+        if (event.type === 'product') {
+          // LLM fallback streams products one by one until the store's final list lands
+          if (finished.has(event.store)) return;
+          payload.results = {
+            ...payload.results,
+            [event.store]: [...payload.results[event.store], event.product],
+          };
+        } else if (event.type === 'store') {
+          finished.add(event.store);
+          payload.results = { ...payload.results, [event.store]: event.results };
+        } else {
+          payload.key = event.key; // the server's canonical key
+          payload.pending = event.pending;
+          payload.comparison = event.comparison;
+          payload.matches = event.matches;
+          // Don't pin partial results in the browser cache. Store them under the
+          // local key, which is what lookups use
+          if (!event.pending.length) {
+            this.writeCache({ ...this.readCache(), [key]: payload });
+          }
+        }
+        this.lastResult = payload;
+        subscriber.next({ ...payload });
+      };
+
+      const sub = this.ndjson<SearchStreamEvent>(
+        this.http.get('http://localhost:8000/api/search/stream', {
+          params: { q: trimmed },
+          observe: 'events',
+          responseType: 'text',
+          reportProgress: true,
+        }),
+      ).subscribe({
+        next: apply,
+        error: (err) => subscriber.error(err),
+        complete: () => subscriber.complete(),
+      });
+
+      return () => sub.unsubscribe();
+    }).pipe(
+      finalize(() => this.inflight.delete(key)),
+      share({
+        connector: () => new ReplaySubject<SearchResultPayload>(1),
+        resetOnRefCountZero: () => timer(INFLIGHT_GRACE_MS),
+      }),
+    );
+
+    this.inflight.set(key, stream$);
+    return stream$;
+  }
+
+  suggest(prefix: string, limit = 8): Observable<TypeaheadSuggestion[]> {
+    const trimmed = prefix.trim();
+    if (!trimmed) return of([]);
+
     return this.http
-      .get<SearchResultPayload>('http://localhost:8000/api/search', {
-        params: { q: trimmed },
+      .get<{ prefix: string; suggestions: TypeaheadSuggestion[] }>('http://localhost:8000/api/typeahead', {
+        params: { q: trimmed, limit },
       })
       .pipe(
-        tap((resp) => {
-          this.lastResult = resp;
-          this.writeCache({ ...cache, [resp.key]: resp });
-        }),
+        map(({ suggestions }) => suggestions),
+        catchError(() => of([])),
       );
   }
 
+  // Asking for the user's top searches queues them for the server's off-peak
+  // warm-up; the browser doesn't crawl them itself
   prefetchTopSearches(userId: number): void {
     this.http
       .get<{ words: string[] }>(`http://localhost:8000/api/user/${userId}/top-searches`)
       .subscribe({
-        next: ({ words }) => {
-          if (!words.length) return;
-
-          const cache = this.readCache();
-
-          const missing = words.filter((w) => !cache[normalizeQuery(w)]);
-          if (!missing.length) return;
-
-          missing.forEach((word, index) => {
-            setTimeout(() => {
-              this.search(word).subscribe();
-            }, index * 2000);
-          });
-        },
         error: () => {
         },
       });